@@ -0,0 +1,102 @@
+-- Migrate existing (unpartitioned) emotibit_* signal tables to monthly range
+-- partitioning on recorded_at, matching table_commands.sql.
+--
+-- Run once, after creating the partition functions from table_commands.sql
+-- (emotibit_create_monthly_partitions and friends). Tables that are already
+-- partitioned are skipped, so the script is safe to re-run.
+--
+-- Each table is renamed to <table>_legacy, recreated as a partitioned table
+-- (keeping the same id sequence), given monthly partitions covering its data,
+-- and copied over. Legacy tables are kept unless drop_legacy is set to true;
+-- drop them yourself once the row counts check out.
+
+do $$
+declare
+  drop_legacy boolean := false;
+  t text;
+  seq text;
+  lo timestamp with time zone;
+  hi timestamp with time zone;
+begin
+  foreach t in array array[
+    'emotibit_ax',
+    'emotibit_ay',
+    'emotibit_az',
+    'emotibit_eda',
+    'emotibit_edl',
+    'emotibit_gyro_x',
+    'emotibit_gyro_y',
+    'emotibit_gyro_z',
+    'emotibit_heart_rate',
+    'emotibit_humidity',
+    'emotibit_inter_beat',
+    'emotibit_magno_x',
+    'emotibit_magno_y',
+    'emotibit_magno_z',
+    'emotibit_ppg_green',
+    'emotibit_ppg_infrared',
+    'emotibit_ppg_red',
+    'emotibit_skin_con_amp',
+    'emotibit_skin_con_freq',
+    'emotibit_skin_con_rise',
+    'emotibit_temp'
+  ]
+  loop
+    if to_regclass('public.' || t) is null then
+      raise notice '%: does not exist, skipped', t;
+      continue;
+    end if;
+    if exists (select 1 from pg_partitioned_table where partrelid = ('public.' || t)::regclass) then
+      -- Earlier fresh installs named a few FKs <t>_id_fkey; align with <t>_device_id_fkey
+      if exists (select 1 from pg_constraint where conrelid = ('public.' || t)::regclass and conname = t || '_id_fkey') then
+        execute format('alter table public.%I rename constraint %I to %I', t, t || '_id_fkey', t || '_device_id_fkey');
+      end if;
+      raise notice '%: already partitioned, skipped', t;
+      continue;
+    end if;
+
+    -- Move the old heap (and its uniquely-named index/constraint) out of the way
+    execute format('alter table public.%I rename to %I', t, t || '_legacy');
+    execute format('alter table public.%I rename constraint %I to %I', t || '_legacy', t || '_pkey', t || '_legacy_pkey');
+    execute format('alter index if exists public.%I rename to %I', t || '_device_time_idx', t || '_legacy_device_time_idx');
+
+    seq := pg_get_serial_sequence('public.' || t || '_legacy', 'id');
+
+    execute format($ddl$
+      create table public.%1$I (
+        id bigint not null default nextval(%2$L::regclass),
+        device_id text not null,
+        recorded_at timestamp with time zone not null,
+        value double precision not null,
+        constraint %3$I primary key (id, recorded_at),
+        constraint %4$I foreign KEY (device_id) references emotibit_devices (device_id) on delete CASCADE
+      ) partition by range (recorded_at)
+    $ddl$, t, seq, t || '_pkey', t || '_device_id_fkey');
+
+    execute format('create table public.%I partition of public.%I default', t || '_default', t);
+    execute format('create index if not exists %I on public.%I using btree (device_id, recorded_at)', t || '_device_time_idx', t);
+    execute format('create index if not exists %I on public.%I using brin (recorded_at)', t || '_time_brin_idx', t);
+
+    execute format('select min(recorded_at), max(recorded_at) from public.%I', t || '_legacy') into lo, hi;
+    if lo is not null then
+      perform public.emotibit_create_monthly_partitions(lo, hi, t);
+    end if;
+
+    execute format(
+      'insert into public.%I (id, device_id, recorded_at, value) select id, device_id, recorded_at, value from public.%I',
+      t, t || '_legacy'
+    );
+
+    execute format('alter sequence %s owned by public.%I.id', seq, t);
+
+    if drop_legacy then
+      execute format('drop table public.%I', t || '_legacy');
+    end if;
+
+    raise notice '%: migrated', t;
+  end loop;
+
+  -- Pre-create the next few months so live ingest does not land in the default partitions
+  perform public.emotibit_create_monthly_partitions(now(), now() + interval '3 months');
+end;
+$$;
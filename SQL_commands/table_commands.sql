@@ -88,227 +88,714 @@ create table public.emotibit_ax (
   device_id text not null,
   recorded_at timestamp with time zone not null,
   value double precision not null,
-  constraint emotibit_ax_pkey primary key (id),
+  constraint emotibit_ax_pkey primary key (id, recorded_at),
   constraint emotibit_ax_device_id_fkey foreign KEY (device_id) references emotibit_devices (device_id) on delete CASCADE
-);
+) partition by range (recorded_at);
+
+create table public.emotibit_ax_default partition of public.emotibit_ax default;
 
 create index IF not exists emotibit_ax_device_time_idx on public.emotibit_ax using btree (device_id, recorded_at);
+create index IF not exists emotibit_ax_time_brin_idx on public.emotibit_ax using brin (recorded_at);
 
 create table public.emotibit_ay (
   id bigserial not null,
   device_id text not null,
   recorded_at timestamp with time zone not null,
   value double precision not null,
-  constraint emotibit_ay_pkey primary key (id),
+  constraint emotibit_ay_pkey primary key (id, recorded_at),
   constraint emotibit_ay_device_id_fkey foreign KEY (device_id) references emotibit_devices (device_id) on delete CASCADE
-);
+) partition by range (recorded_at);
+
+create table public.emotibit_ay_default partition of public.emotibit_ay default;
 
 create index IF not exists emotibit_ay_device_time_idx on public.emotibit_ay using btree (device_id, recorded_at);
+create index IF not exists emotibit_ay_time_brin_idx on public.emotibit_ay using brin (recorded_at);
 
 create table public.emotibit_az (
   id bigserial not null,
   device_id text not null,
   recorded_at timestamp with time zone not null,
   value double precision not null,
-  constraint emotibit_az_pkey primary key (id),
+  constraint emotibit_az_pkey primary key (id, recorded_at),
   constraint emotibit_az_device_id_fkey foreign KEY (device_id) references emotibit_devices (device_id) on delete CASCADE
-);
+) partition by range (recorded_at);
+
+create table public.emotibit_az_default partition of public.emotibit_az default;
 
 create index IF not exists emotibit_az_device_time_idx on public.emotibit_az using btree (device_id, recorded_at);
+create index IF not exists emotibit_az_time_brin_idx on public.emotibit_az using brin (recorded_at);
 
 create table public.emotibit_eda (
   id bigserial not null,
   device_id text not null,
   recorded_at timestamp with time zone not null,
   value double precision not null,
-  constraint emotibit_eda_pkey primary key (id),
+  constraint emotibit_eda_pkey primary key (id, recorded_at),
   constraint emotibit_eda_device_id_fkey foreign KEY (device_id) references emotibit_devices (device_id) on delete CASCADE
-);
+) partition by range (recorded_at);
+
+create table public.emotibit_eda_default partition of public.emotibit_eda default;
 
 create index IF not exists emotibit_eda_device_time_idx on public.emotibit_eda using btree (device_id, recorded_at);
+create index IF not exists emotibit_eda_time_brin_idx on public.emotibit_eda using brin (recorded_at);
 
 create table public.emotibit_edl (
   id bigserial not null,
   device_id text not null,
   recorded_at timestamp with time zone not null,
   value double precision not null,
-  constraint emotibit_edl_pkey primary key (id),
+  constraint emotibit_edl_pkey primary key (id, recorded_at),
   constraint emotibit_edl_device_id_fkey foreign KEY (device_id) references emotibit_devices (device_id) on delete CASCADE
-);
+) partition by range (recorded_at);
+
+create table public.emotibit_edl_default partition of public.emotibit_edl default;
 
 create index IF not exists emotibit_edl_device_time_idx on public.emotibit_edl using btree (device_id, recorded_at);
+create index IF not exists emotibit_edl_time_brin_idx on public.emotibit_edl using brin (recorded_at);
 
 create table public.emotibit_gyro_x (
   id bigserial not null,
   device_id text not null,
   recorded_at timestamp with time zone not null,
   value double precision not null,
-  constraint emotibit_gyro_x_pkey primary key (id),
+  constraint emotibit_gyro_x_pkey primary key (id, recorded_at),
   constraint emotibit_gyro_x_device_id_fkey foreign KEY (device_id) references emotibit_devices (device_id) on delete CASCADE
-);
+) partition by range (recorded_at);
+
+create table public.emotibit_gyro_x_default partition of public.emotibit_gyro_x default;
 
 create index IF not exists emotibit_gyro_x_device_time_idx on public.emotibit_gyro_x using btree (device_id, recorded_at);
+create index IF not exists emotibit_gyro_x_time_brin_idx on public.emotibit_gyro_x using brin (recorded_at);
 
 create table public.emotibit_gyro_y (
   id bigserial not null,
   device_id text not null,
   recorded_at timestamp with time zone not null,
   value double precision not null,
-  constraint emotibit_gyro_y_pkey primary key (id),
+  constraint emotibit_gyro_y_pkey primary key (id, recorded_at),
   constraint emotibit_gyro_y_device_id_fkey foreign KEY (device_id) references emotibit_devices (device_id) on delete CASCADE
-);
+) partition by range (recorded_at);
+
+create table public.emotibit_gyro_y_default partition of public.emotibit_gyro_y default;
 
 create index IF not exists emotibit_gyro_y_device_time_idx on public.emotibit_gyro_y using btree (device_id, recorded_at);
+create index IF not exists emotibit_gyro_y_time_brin_idx on public.emotibit_gyro_y using brin (recorded_at);
 
 create table public.emotibit_gyro_z (
   id bigserial not null,
   device_id text not null,
   recorded_at timestamp with time zone not null,
   value double precision not null,
-  constraint emotibit_gyro_z_pkey primary key (id),
+  constraint emotibit_gyro_z_pkey primary key (id, recorded_at),
   constraint emotibit_gyro_z_device_id_fkey foreign KEY (device_id) references emotibit_devices (device_id) on delete CASCADE
-);
+) partition by range (recorded_at);
+
+create table public.emotibit_gyro_z_default partition of public.emotibit_gyro_z default;
 
 create index IF not exists emotibit_gyro_z_device_time_idx on public.emotibit_gyro_z using btree (device_id, recorded_at);
+create index IF not exists emotibit_gyro_z_time_brin_idx on public.emotibit_gyro_z using brin (recorded_at);
 
 create table public.emotibit_heart_rate (
   id bigserial not null,
   device_id text not null,
   recorded_at timestamp with time zone not null,
   value double precision not null,
-  constraint emotibit_heart_rate_pkey primary key (id),
+  constraint emotibit_heart_rate_pkey primary key (id, recorded_at),
   constraint emotibit_heart_rate_device_id_fkey foreign KEY (device_id) references emotibit_devices (device_id) on delete CASCADE
-);
+) partition by range (recorded_at);
+
+create table public.emotibit_heart_rate_default partition of public.emotibit_heart_rate default;
 
 create index IF not exists emotibit_heart_rate_device_time_idx on public.emotibit_heart_rate using btree (device_id, recorded_at);
+create index IF not exists emotibit_heart_rate_time_brin_idx on public.emotibit_heart_rate using brin (recorded_at);
 
 create table public.emotibit_humidity (
   id bigserial not null,
   device_id text not null,
   recorded_at timestamp with time zone not null,
   value double precision not null,
-  constraint emotibit_humidity_pkey primary key (id),
+  constraint emotibit_humidity_pkey primary key (id, recorded_at),
   constraint emotibit_humidity_device_id_fkey foreign KEY (device_id) references emotibit_devices (device_id) on delete CASCADE
-);
+) partition by range (recorded_at);
+
+create table public.emotibit_humidity_default partition of public.emotibit_humidity default;
 
 create index IF not exists emotibit_humidity_device_time_idx on public.emotibit_humidity using btree (device_id, recorded_at);
+create index IF not exists emotibit_humidity_time_brin_idx on public.emotibit_humidity using brin (recorded_at);
 
 create table public.emotibit_inter_beat (
   id bigserial not null,
   device_id text not null,
   recorded_at timestamp with time zone not null,
   value double precision not null,
-  constraint emotibit_inter_beat_pkey primary key (id),
+  constraint emotibit_inter_beat_pkey primary key (id, recorded_at),
   constraint emotibit_inter_beat_device_id_fkey foreign KEY (device_id) references emotibit_devices (device_id) on delete CASCADE
-);
+) partition by range (recorded_at);
+
+create table public.emotibit_inter_beat_default partition of public.emotibit_inter_beat default;
 
 create index IF not exists emotibit_inter_beat_device_time_idx on public.emotibit_inter_beat using btree (device_id, recorded_at);
+create index IF not exists emotibit_inter_beat_time_brin_idx on public.emotibit_inter_beat using brin (recorded_at);
 
 create table public.emotibit_magno_x (
   id bigserial not null,
   device_id text not null,
   recorded_at timestamp with time zone not null,
   value double precision not null,
-  constraint emotibit_magno_x_pkey primary key (id),
+  constraint emotibit_magno_x_pkey primary key (id, recorded_at),
   constraint emotibit_magno_x_device_id_fkey foreign KEY (device_id) references emotibit_devices (device_id) on delete CASCADE
-);
+) partition by range (recorded_at);
+
+create table public.emotibit_magno_x_default partition of public.emotibit_magno_x default;
+
+create index IF not exists emotibit_magno_x_device_time_idx on public.emotibit_magno_x using btree (device_id, recorded_at);
+create index IF not exists emotibit_magno_x_time_brin_idx on public.emotibit_magno_x using brin (recorded_at);
 
 create table public.emotibit_magno_y (
   id bigserial not null,
   device_id text not null,
   recorded_at timestamp with time zone not null,
   value double precision not null,
-  constraint emotibit_magno_y_pkey primary key (id),
+  constraint emotibit_magno_y_pkey primary key (id, recorded_at),
   constraint emotibit_magno_y_device_id_fkey foreign KEY (device_id) references emotibit_devices (device_id) on delete CASCADE
-);
+) partition by range (recorded_at);
+
+create table public.emotibit_magno_y_default partition of public.emotibit_magno_y default;
 
 create index IF not exists emotibit_magno_y_device_time_idx on public.emotibit_magno_y using btree (device_id, recorded_at);
+create index IF not exists emotibit_magno_y_time_brin_idx on public.emotibit_magno_y using brin (recorded_at);
 
 create table public.emotibit_magno_z (
   id bigserial not null,
   device_id text not null,
   recorded_at timestamp with time zone not null,
   value double precision not null,
-  constraint emotibit_magno_z_pkey primary key (id),
+  constraint emotibit_magno_z_pkey primary key (id, recorded_at),
   constraint emotibit_magno_z_device_id_fkey foreign KEY (device_id) references emotibit_devices (device_id) on delete CASCADE
-);
+) partition by range (recorded_at);
+
+create table public.emotibit_magno_z_default partition of public.emotibit_magno_z default;
 
 create index IF not exists emotibit_magno_z_device_time_idx on public.emotibit_magno_z using btree (device_id, recorded_at);
+create index IF not exists emotibit_magno_z_time_brin_idx on public.emotibit_magno_z using brin (recorded_at);
 
 create table public.emotibit_ppg_green (
   id bigserial not null,
   device_id text not null,
   recorded_at timestamp with time zone not null,
   value double precision not null,
-  constraint emotibit_ppg_green_pkey primary key (id),
+  constraint emotibit_ppg_green_pkey primary key (id, recorded_at),
   constraint emotibit_ppg_green_device_id_fkey foreign KEY (device_id) references emotibit_devices (device_id) on delete CASCADE
-);
+) partition by range (recorded_at);
+
+create table public.emotibit_ppg_green_default partition of public.emotibit_ppg_green default;
 
 create index IF not exists emotibit_ppg_green_device_time_idx on public.emotibit_ppg_green using btree (device_id, recorded_at);
+create index IF not exists emotibit_ppg_green_time_brin_idx on public.emotibit_ppg_green using brin (recorded_at);
 
 create table public.emotibit_ppg_infrared (
   id bigserial not null,
   device_id text not null,
   recorded_at timestamp with time zone not null,
   value double precision not null,
-  constraint emotibit_ppg_infrared_pkey primary key (id),
-  constraint emotibit_ppg_infrared_id_fkey foreign KEY (device_id) references emotibit_devices (device_id) on delete CASCADE
-);
+  constraint emotibit_ppg_infrared_pkey primary key (id, recorded_at),
+  constraint emotibit_ppg_infrared_device_id_fkey foreign KEY (device_id) references emotibit_devices (device_id) on delete CASCADE
+) partition by range (recorded_at);
+
+create table public.emotibit_ppg_infrared_default partition of public.emotibit_ppg_infrared default;
 
 create index IF not exists emotibit_ppg_infrared_device_time_idx on public.emotibit_ppg_infrared using btree (device_id, recorded_at);
+create index IF not exists emotibit_ppg_infrared_time_brin_idx on public.emotibit_ppg_infrared using brin (recorded_at);
 
 create table public.emotibit_ppg_red (
   id bigserial not null,
   device_id text not null,
   recorded_at timestamp with time zone not null,
   value double precision not null,
-  constraint emotibit_ppg_red_pkey primary key (id),
-  constraint emotibit_ppg_red_id_fkey foreign KEY (device_id) references emotibit_devices (device_id) on delete CASCADE
-);
+  constraint emotibit_ppg_red_pkey primary key (id, recorded_at),
+  constraint emotibit_ppg_red_device_id_fkey foreign KEY (device_id) references emotibit_devices (device_id) on delete CASCADE
+) partition by range (recorded_at);
+
+create table public.emotibit_ppg_red_default partition of public.emotibit_ppg_red default;
 
 create index IF not exists emotibit_ppg_red_device_time_idx on public.emotibit_ppg_red using btree (device_id, recorded_at);
+create index IF not exists emotibit_ppg_red_time_brin_idx on public.emotibit_ppg_red using brin (recorded_at);
 
 create table public.emotibit_skin_con_amp (
   id bigserial not null,
   device_id text not null,
   recorded_at timestamp with time zone not null,
   value double precision not null,
-  constraint emotibit_skin_con_amp_pkey primary key (id),
+  constraint emotibit_skin_con_amp_pkey primary key (id, recorded_at),
   constraint emotibit_skin_con_amp_device_id_fkey foreign KEY (device_id) references emotibit_devices (device_id) on delete CASCADE
-);
+) partition by range (recorded_at);
+
+create table public.emotibit_skin_con_amp_default partition of public.emotibit_skin_con_amp default;
 
 create index IF not exists emotibit_skin_con_amp_device_time_idx on public.emotibit_skin_con_amp using btree (device_id, recorded_at);
+create index IF not exists emotibit_skin_con_amp_time_brin_idx on public.emotibit_skin_con_amp using brin (recorded_at);
 
 create table public.emotibit_skin_con_freq (
   id bigserial not null,
   device_id text not null,
   recorded_at timestamp with time zone not null,
   value double precision not null,
-  constraint emotibit_skin_con_freq_pkey primary key (id),
+  constraint emotibit_skin_con_freq_pkey primary key (id, recorded_at),
   constraint emotibit_skin_con_freq_device_id_fkey foreign KEY (device_id) references emotibit_devices (device_id) on delete CASCADE
-);
+) partition by range (recorded_at);
+
+create table public.emotibit_skin_con_freq_default partition of public.emotibit_skin_con_freq default;
 
 create index IF not exists emotibit_skin_con_freq_device_time_idx on public.emotibit_skin_con_freq using btree (device_id, recorded_at);
+create index IF not exists emotibit_skin_con_freq_time_brin_idx on public.emotibit_skin_con_freq using brin (recorded_at);
 
 create table public.emotibit_skin_con_rise (
   id bigserial not null,
   device_id text not null,
   recorded_at timestamp with time zone not null,
   value double precision not null,
-  constraint emotibit_skin_con_rise_pkey primary key (id),
+  constraint emotibit_skin_con_rise_pkey primary key (id, recorded_at),
   constraint emotibit_skin_con_rise_device_id_fkey foreign KEY (device_id) references emotibit_devices (device_id) on delete CASCADE
-);
+) partition by range (recorded_at);
+
+create table public.emotibit_skin_con_rise_default partition of public.emotibit_skin_con_rise default;
 
 create index IF not exists emotibit_skin_con_rise_device_time_idx on public.emotibit_skin_con_rise using btree (device_id, recorded_at);
+create index IF not exists emotibit_skin_con_rise_time_brin_idx on public.emotibit_skin_con_rise using brin (recorded_at);
 
 create table public.emotibit_temp (
   id bigserial not null,
   device_id text not null,
   recorded_at timestamp with time zone not null,
   value double precision not null,
-  constraint emotibit_temp_pkey primary key (id),
-  constraint emotibit_temp_id_fkey foreign KEY (device_id) references emotibit_devices (device_id) on delete CASCADE
-);
+  constraint emotibit_temp_pkey primary key (id, recorded_at),
+  constraint emotibit_temp_device_id_fkey foreign KEY (device_id) references emotibit_devices (device_id) on delete CASCADE
+) partition by range (recorded_at);
+
+create table public.emotibit_temp_default partition of public.emotibit_temp default;
 
 create index IF not exists emotibit_temp_device_time_idx on public.emotibit_temp using btree (device_id, recorded_at);
+create index IF not exists emotibit_temp_time_brin_idx on public.emotibit_temp using brin (recorded_at);
+
+
+
+-- Per-device, per-window aggregates for one emotibit_* signal table.
+-- Samples are binned at stride granularity once; each window is the union of
+-- window/stride consecutive bins, so overlapping windows never rescan raw rows.
+-- window_start is aligned to multiples of the stride since the Unix epoch.
+-- Returns only windows that contain at least one sample.
+create or replace function public.emotibit_window_aggregates(
+  p_table text,
+  p_window_seconds integer default 10,
+  p_stride_seconds integer default 5,
+  p_start timestamp with time zone default null,
+  p_end timestamp with time zone default null
+)
+returns table (
+  device_id text,
+  window_start timestamp with time zone,
+  window_end timestamp with time zone,
+  n bigint,
+  mean double precision,
+  std double precision,
+  min double precision,
+  max double precision,
+  sum_sq double precision,
+  last_value double precision,
+  first_at timestamp with time zone,
+  last_at timestamp with time zone
+)
+language plpgsql
+stable
+as $$
+declare
+  k integer;
+begin
+  if p_table !~ '^emotibit_[a-z_]+$' or p_table = 'emotibit_devices' then
+    raise exception 'not an emotibit signal table: %', p_table;
+  end if;
+  if p_stride_seconds <= 0 or p_window_seconds <= 0 or p_window_seconds % p_stride_seconds <> 0 then
+    raise exception 'window (%) must be a positive multiple of stride (%)', p_window_seconds, p_stride_seconds;
+  end if;
+  k := p_window_seconds / p_stride_seconds;
+
+  return query execute format($q$
+    with bins as (
+      select
+        s.device_id,
+        floor(extract(epoch from s.recorded_at) / $1)::bigint as bin,
+        count(*) as n,
+        sum(s.value) as s1,
+        sum(s.value * s.value) as s2,
+        min(s.value) as lo,
+        max(s.value) as hi,
+        min(s.recorded_at) as first_at,
+        max(s.recorded_at) as last_at,
+        (array_agg(s.value order by s.recorded_at desc))[1] as last_value
+      from public.%I s
+      where ($3::timestamptz is null or s.recorded_at >= $3)
+        and ($4::timestamptz is null or s.recorded_at < $4)
+      group by 1, 2
+    ),
+    windows as (
+      select
+        b.device_id,
+        b.bin - o.off as w,
+        sum(b.n)::bigint as n,
+        sum(b.s1) as s1,
+        sum(b.s2) as s2,
+        min(b.lo) as lo,
+        max(b.hi) as hi,
+        min(b.first_at) as first_at,
+        max(b.last_at) as last_at,
+        (array_agg(b.last_value order by b.last_at desc))[1] as last_value
+      from bins b
+      cross join generate_series(0, $2 - 1) as o(off)
+      group by 1, 2
+    )
+    select
+      w.device_id,
+      to_timestamp(w.w * $1) as window_start,
+      to_timestamp((w.w + $2) * $1) as window_end,
+      w.n,
+      w.s1 / w.n as mean,
+      sqrt(greatest(w.s2 / w.n - (w.s1 / w.n) ^ 2, 0)) as std,
+      w.lo as min,
+      w.hi as max,
+      w.s2 as sum_sq,
+      w.last_value,
+      w.first_at,
+      w.last_at
+    from windows w
+    order by w.device_id, w.w
+  $q$, p_table)
+  using p_stride_seconds, k, p_start, p_end;
+end;
+$$;
+
+
+-- Monthly partition management for the emotibit_* signal tables.
+-- Partitions are named <table>_pYYYY_MM and cover [month start, next month start) in UTC.
+-- Rows outside every monthly partition land in <table>_default.
+
+-- Create missing monthly partitions covering [p_from, p_to] for every partitioned
+-- emotibit_* table (or only p_table). Rows already sitting in the default partition
+-- for a new month are moved into it. Returns the partitions created.
+create or replace function public.emotibit_create_monthly_partitions(
+  p_from timestamp with time zone,
+  p_to timestamp with time zone,
+  p_table text default null
+)
+returns setof text
+language plpgsql
+security definer
+set search_path = public
+set timezone = 'UTC'
+as $$
+declare
+  t text;
+  m timestamp with time zone;
+  part text;
+  has_rows boolean;
+begin
+  for t in
+    select c.relname::text
+    from pg_partitioned_table pt
+    join pg_class c on c.oid = pt.partrelid
+    join pg_namespace ns on ns.oid = c.relnamespace
+    where ns.nspname = 'public'
+      and c.relname like 'emotibit\_%'
+      and (p_table is null or c.relname = p_table)
+  loop
+    m := date_trunc('month', p_from);
+    while m <= p_to loop
+      part := format('%s_p%s', t, to_char(m, 'YYYY_MM'));
+
+      if to_regclass('public.' || part) is null then
+        execute format(
+          'select exists (select 1 from public.%I where recorded_at >= %L and recorded_at < %L)',
+          t || '_default', m, m + interval '1 month'
+        ) into has_rows;
+
+        if has_rows then
+          execute format('create table public.%I (like public.%I including defaults including constraints)', part, t);
+          execute format(
+            'with moved as (delete from public.%I where recorded_at >= %L and recorded_at < %L returning *) '
+            'insert into public.%I select * from moved',
+            t || '_default', m, m + interval '1 month', part
+          );
+          execute format(
+            'alter table public.%I attach partition public.%I for values from (%L) to (%L)',
+            t, part, m, m + interval '1 month'
+          );
+        else
+          execute format(
+            'create table public.%I partition of public.%I for values from (%L) to (%L)',
+            part, t, m, m + interval '1 month'
+          );
+        end if;
+
+        return next part;
+      end if;
+
+      m := m + interval '1 month';
+    end loop;
+  end loop;
+end;
+$$;
+
+-- Detach monthly partitions that end on or before p_before (optionally dropping them).
+-- Detached partitions stay behind as plain tables for archiving (pg_dump) or later drop.
+-- Returns the partitions detached.
+create or replace function public.emotibit_detach_partitions_before(
+  p_before timestamp with time zone,
+  p_drop boolean default false,
+  p_table text default null
+)
+returns setof text
+language plpgsql
+security definer
+set search_path = public
+set timezone = 'UTC'
+as $$
+declare
+  r record;
+begin
+  for r in
+    select parent.relname::text as parent, child.relname::text as child
+    from pg_inherits i
+    join pg_class parent on parent.oid = i.inhparent
+    join pg_class child on child.oid = i.inhrelid
+    join pg_namespace ns on ns.oid = parent.relnamespace
+    where ns.nspname = 'public'
+      and parent.relname like 'emotibit\_%'
+      and (p_table is null or parent.relname = p_table)
+      and child.relname ~ '_p\d{4}_\d{2}$'
+      and to_timestamp(right(child.relname, 7), 'YYYY_MM') + interval '1 month' <= p_before
+    order by child.relname
+  loop
+    execute format('alter table public.%I detach partition public.%I', r.parent, r.child);
+    if p_drop then
+      execute format('drop table public.%I', r.child);
+    end if;
+    return next r.child;
+  end loop;
+end;
+$$;
+
+-- Partitions of every emotibit_* table with approximate row counts and on-disk size.
+create or replace function public.emotibit_list_partitions()
+returns table (
+  parent text,
+  partition text,
+  bounds text,
+  approx_rows bigint,
+  total_bytes bigint
+)
+language sql
+stable
+security definer
+set search_path = public
+as $$
+  select
+    parent.relname::text,
+    child.relname::text,
+    pg_get_expr(child.relpartbound, child.oid),
+    greatest(child.reltuples, 0)::bigint,
+    pg_total_relation_size(child.oid)
+  from pg_inherits i
+  join pg_class parent on parent.oid = i.inhparent
+  join pg_class child on child.oid = i.inhrelid
+  join pg_namespace ns on ns.oid = parent.relnamespace
+  where ns.nspname = 'public'
+    and parent.relname like 'emotibit\_%'
+  order by parent.relname, child.relname;
+$$;
+
+-- DDL helpers: service role only (not callable by anon/authenticated via PostgREST)
+revoke execute on function public.emotibit_create_monthly_partitions(timestamp with time zone, timestamp with time zone, text) from public, anon, authenticated;
+revoke execute on function public.emotibit_detach_partitions_before(timestamp with time zone, boolean, text) from public, anon, authenticated;
+revoke execute on function public.emotibit_list_partitions() from public, anon, authenticated;
+grant execute on function public.emotibit_create_monthly_partitions(timestamp with time zone, timestamp with time zone, text) to service_role;
+grant execute on function public.emotibit_detach_partitions_before(timestamp with time zone, boolean, text) to service_role;
+grant execute on function public.emotibit_list_partitions() to service_role;
+
+
+-- Downsampled rollups of the emotibit_* signal tables at 1s / 10s / 1min.
+-- signal is the table name without the "emotibit_" prefix (e.g. "ppg_green").
+-- n and sum are kept so coarser levels (and any re-aggregation) stay exact.
+create table public.emotibit_rollup_1s (
+  signal text not null,
+  device_id text not null,
+  bucket timestamp with time zone not null,
+  n integer not null,
+  sum double precision not null,
+  min double precision not null,
+  max double precision not null,
+  mean double precision generated always as (sum / n) stored,
+  constraint emotibit_rollup_1s_pkey primary key (signal, device_id, bucket),
+  constraint emotibit_rollup_1s_device_id_fkey foreign KEY (device_id) references emotibit_devices (device_id) on delete CASCADE
+);
 
+create table public.emotibit_rollup_10s (
+  signal text not null,
+  device_id text not null,
+  bucket timestamp with time zone not null,
+  n integer not null,
+  sum double precision not null,
+  min double precision not null,
+  max double precision not null,
+  mean double precision generated always as (sum / n) stored,
+  constraint emotibit_rollup_10s_pkey primary key (signal, device_id, bucket),
+  constraint emotibit_rollup_10s_device_id_fkey foreign KEY (device_id) references emotibit_devices (device_id) on delete CASCADE
+);
+
+create table public.emotibit_rollup_1m (
+  signal text not null,
+  device_id text not null,
+  bucket timestamp with time zone not null,
+  n integer not null,
+  sum double precision not null,
+  min double precision not null,
+  max double precision not null,
+  mean double precision generated always as (sum / n) stored,
+  constraint emotibit_rollup_1m_pkey primary key (signal, device_id, bucket),
+  constraint emotibit_rollup_1m_device_id_fkey foreign KEY (device_id) references emotibit_devices (device_id) on delete CASCADE
+);
+
+-- Recompute all three rollup levels of one signal table for [p_from, p_to),
+-- widened to whole minutes. Returns the number of 1s buckets written.
+-- Safe to re-run over the same span (buckets are replaced, not added to).
+create or replace function public.emotibit_refresh_rollups(
+  p_table text,
+  p_from timestamp with time zone,
+  p_to timestamp with time zone
+)
+returns integer
+language plpgsql
+set timezone = 'UTC'
+as $$
+declare
+  sig text;
+  lo timestamp with time zone;
+  hi timestamp with time zone;
+  written integer;
+begin
+  if p_table !~ '^emotibit_[a-z_]+$' or p_table = 'emotibit_devices' or p_table like 'emotibit\_rollup\_%' then
+    raise exception 'not an emotibit signal table: %', p_table;
+  end if;
+  sig := substr(p_table, length('emotibit_') + 1);
+  lo := date_trunc('minute', p_from);
+  hi := date_trunc('minute', p_to) + interval '1 minute';
+
+  delete from public.emotibit_rollup_1s r where r.signal = sig and r.bucket >= lo and r.bucket < hi;
+  execute format($q$
+    insert into public.emotibit_rollup_1s (signal, device_id, bucket, n, sum, min, max)
+    select $1, s.device_id, date_trunc('second', s.recorded_at), count(*), sum(s.value), min(s.value), max(s.value)
+    from public.%I s
+    where s.recorded_at >= $2 and s.recorded_at < $3
+    group by 2, 3
+  $q$, p_table)
+  using sig, lo, hi;
+  get diagnostics written = row_count;
+
+  delete from public.emotibit_rollup_10s r where r.signal = sig and r.bucket >= lo and r.bucket < hi;
+  insert into public.emotibit_rollup_10s (signal, device_id, bucket, n, sum, min, max)
+  select sig, r.device_id, to_timestamp(floor(extract(epoch from r.bucket) / 10) * 10), sum(r.n), sum(r.sum), min(r.min), max(r.max)
+  from public.emotibit_rollup_1s r
+  where r.signal = sig and r.bucket >= lo and r.bucket < hi
+  group by 2, 3;
+
+  delete from public.emotibit_rollup_1m r where r.signal = sig and r.bucket >= lo and r.bucket < hi;
+  insert into public.emotibit_rollup_1m (signal, device_id, bucket, n, sum, min, max)
+  select sig, r.device_id, date_trunc('minute', r.bucket), sum(r.n), sum(r.sum), min(r.min), max(r.max)
+  from public.emotibit_rollup_10s r
+  where r.signal = sig and r.bucket >= lo and r.bucket < hi
+  group by 2, 3;
+
+  return written;
+end;
+$$;
+
+-- Deletes and rebuilds rollups: service role only, like the partition helpers
+revoke execute on function public.emotibit_refresh_rollups(text, timestamp with time zone, timestamp with time zone) from public, anon, authenticated;
+grant execute on function public.emotibit_refresh_rollups(text, timestamp with time zone, timestamp with time zone) to service_role;
+
+-- Read one signal over [p_from, p_to) from the finest rollup level that keeps the
+-- span within p_max_points buckets per device, i.e. coarser levels for longer spans.
+create or replace function public.emotibit_rollup_query(
+  p_table text,
+  p_from timestamp with time zone,
+  p_to timestamp with time zone,
+  p_device_id text default null,
+  p_max_points integer default 2000
+)
+returns table (
+  resolution_seconds integer,
+  device_id text,
+  bucket timestamp with time zone,
+  n integer,
+  mean double precision,
+  min double precision,
+  max double precision
+)
+language plpgsql
+stable
+as $$
+declare
+  span double precision := extract(epoch from p_to - p_from);
+  res integer;
+  suffix text;
+begin
+  if span <= p_max_points then
+    res := 1; suffix := '1s';
+  elsif span / 10 <= p_max_points then
+    res := 10; suffix := '10s';
+  else
+    res := 60; suffix := '1m';
+  end if;
+
+  return query execute format($q$
+    select %s, r.device_id, r.bucket, r.n, r.mean, r.min, r.max
+    from public.%I r
+    where r.signal = $1
+      and r.bucket >= $2 and r.bucket < $3
+      and ($4::text is null or r.device_id = $4)
+    order by r.device_id, r.bucket
+  $q$, res, 'emotibit_rollup_' || suffix)
+  using substr(p_table, length('emotibit_') + 1), p_from, p_to, p_device_id;
+end;
+$$;
+
+
+-- Known-bad spans per device and signal, written by batch_ingest's quality stage:
+-- gaps between consecutive good samples of a dense channel (after dropping
+-- duplicate, out-of-order and low-reliability packets). The trainer skips
+-- windows that mostly fall inside these before computing features.
+create table public.emotibit_coverage (
+  id bigserial not null,
+  device_id text not null,
+  signal text not null,
+  session text not null,
+  start_at timestamp with time zone not null,
+  end_at timestamp with time zone not null,
+  created_at timestamp with time zone null default now(),
+  constraint emotibit_coverage_pkey primary key (id),
+  constraint emotibit_coverage_span_key unique (device_id, signal, start_at),
+  constraint emotibit_coverage_device_id_fkey foreign KEY (device_id) references emotibit_devices (device_id) on delete CASCADE
+);
+
+-- First/last good sample of each device's channel per session. A device with no
+-- span over a window wasn't recording then, so its lack of gaps there says nothing.
+create table public.emotibit_recording_spans (
+  id bigserial not null,
+  device_id text not null,
+  signal text not null,
+  session text not null,
+  start_at timestamp with time zone not null,
+  end_at timestamp with time zone not null,
+  created_at timestamp with time zone null default now(),
+  constraint emotibit_recording_spans_pkey primary key (id),
+  constraint emotibit_recording_spans_session_key unique (device_id, signal, session),
+  constraint emotibit_recording_spans_device_id_fkey foreign KEY (device_id) references emotibit_devices (device_id) on delete CASCADE
+);
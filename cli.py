@@ -0,0 +1,134 @@
+"""
+Unified entry point for the Python side of BehaviorTrace.
+
+    python cli.py ingest   [--base-dir DIR] [--backend rest|copy]
+    python cli.py export   [--out-dir DIR] [--mode raw|aggregates|rollups]
+    python cli.py train    [--data-dir DIR] [--model-dir DIR] [--feature-source raw|aggregates]
+    python cli.py serve    [--model-dir DIR]
+    python cli.py replay   SESSION [--model-dir DIR] [--speed X]
+    python cli.py partitions ...   /   python cli.py rollups ...
+    python cli.py startup  (cold-start import time of every subcommand)
+
+Only the selected subcommand's module is imported, so e.g. `serve` never loads
+supabase and `ingest` never loads sklearn or pylsl.
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+STARTED = time.perf_counter()
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+PIPELINE_DIR = os.path.join(ROOT, "python_pipeline")
+TRAIN_DIR = os.path.join(ROOT, "train_model")
+
+# subcommand -> (directory, module) it runs from
+MODULES = {
+    "ingest": (PIPELINE_DIR, "batch_ingest"),
+    "partitions": (PIPELINE_DIR, "partitions"),
+    "rollups": (PIPELINE_DIR, "rollups"),
+    "export": (TRAIN_DIR, "extract_data"),
+    "train": (TRAIN_DIR, "train_emotibit_model"),
+    "serve": (TRAIN_DIR, "real_time_prediction"),
+    "replay": (TRAIN_DIR, "replay"),
+}
+
+
+def load(command: str):
+    """Import the module behind a subcommand (the scripts are flat, not packages)."""
+    import importlib
+
+    directory, module = MODULES[command]
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+
+    t0 = time.perf_counter()
+    mod = importlib.import_module(module)
+    if os.getenv("BT_TIMING"):
+        print(f"[TIMING] import {module}: {(time.perf_counter() - t0) * 1000:.0f}ms")
+    return mod
+
+
+def measure_startup():
+    """Import each subcommand's module in a fresh interpreter and report the time."""
+    print(f"{'command':12s} {'module':22s} import time")
+    for command, (directory, module) in MODULES.items():
+        code = (
+            "import sys, time\n"
+            f"sys.path.insert(0, {directory!r})\n"
+            "t0 = time.perf_counter()\n"
+            f"import {module}\n"
+            "print(time.perf_counter() - t0)\n"
+        )
+        res = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=directory)
+        if res.returncode == 0:
+            result = f"{float(res.stdout.strip().splitlines()[-1]) * 1000:8.0f}ms"
+        else:
+            last = (res.stderr.strip().splitlines() or ["failed"])[-1]
+            result = f"unavailable ({last})"
+        print(f"{command:12s} {module:22s} {result}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="BehaviorTrace data pipeline")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("ingest", help="upload EmotiBit SD card sessions")
+    p.add_argument("--base-dir", default=os.path.join(PIPELINE_DIR, "emotibit_SD_data"))
+    p.add_argument("--backend", choices=["rest", "copy"], default=None,
+                   help="override INGEST_BACKEND")
+
+    p = sub.add_parser("export", help="download training data from Supabase")
+    p.add_argument("--out-dir", default=os.path.join(TRAIN_DIR, "training_data"))
+    p.add_argument("--mode", choices=["raw", "aggregates", "rollups"], default=None)
+
+    p = sub.add_parser("train", help="window exported data and train the classifier")
+    p.add_argument("--data-dir", default=os.path.join(TRAIN_DIR, "training_data"))
+    p.add_argument("--model-dir", default=os.path.join(TRAIN_DIR, "models"))
+    p.add_argument("--feature-source", choices=["raw", "aggregates"], default=None)
+
+    p = sub.add_parser("serve", help="real-time predictions from LSL streams")
+    p.add_argument("--model-dir", default=os.path.join(TRAIN_DIR, "models"))
+
+    p = sub.add_parser("replay", help="run a recorded SD session through the real-time pipeline")
+    p.add_argument("session", help="session prefix or any of its files (e.g. ..._info.json)")
+    p.add_argument("--model-dir", default=os.path.join(TRAIN_DIR, "models"))
+    p.add_argument("--speed", type=float, default=0.0, help="0 = as fast as possible, 1 = real time")
+
+    # Thin pass-through: these two parse their own arguments
+    for command in ("partitions", "rollups"):
+        sub.add_parser(command, help=f"same arguments as python_pipeline/{command}.py")
+
+    sub.add_parser("startup", help="measure cold-start import time of each subcommand")
+
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv and argv[0] in ("partitions", "rollups"):
+        load(argv[0]).main(argv[1:])
+        return
+
+    args = parser.parse_args(argv)
+
+    if args.command == "startup":
+        measure_startup()
+        return
+
+    mod = load(args.command)
+
+    if args.command == "ingest":
+        if args.backend:
+            mod.INGEST_BACKEND = args.backend
+        mod.main(args.base_dir)
+    elif args.command == "export":
+        mod.main(args.out_dir, args.mode or mod.EXTRACT_MODE)
+    elif args.command == "train":
+        mod.main(args.data_dir, args.feature_source or mod.FEATURE_SOURCE, args.model_dir)
+    elif args.command == "serve":
+        mod.main(args.model_dir, started=STARTED)
+    elif args.command == "replay":
+        mod.main(args.session, args.model_dir, args.speed, started=STARTED)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,58 @@
 import os
+import io
 import json
+import numpy as np
 import pandas as pd
-from dotenv import load_dotenv
-from supabase import create_client
 
-from datetime import datetime
-from zoneinfo import ZoneInfo
+from supabase_client import get_supabase  # loads .env before the config below
+from time_sync import load_clock_map, aligned_timestamps
+from partitions import ensure_partitions
+from rollups import refresh_rollups
+from quality import coverage_map
 
 
-# Load env vars
-load_dotenv()
+BASE_DIR = "emotibit_SD_data"
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+# SD card file tag -> Supabase table
+CHANNEL_TABLES = {
+    "AX": "emotibit_ax",
+    "AY": "emotibit_ay",
+    "AZ": "emotibit_az",
+    "EA": "emotibit_eda",
+    "EL": "emotibit_edl",
+    "GX": "emotibit_gyro_x",
+    "GY": "emotibit_gyro_y",
+    "GZ": "emotibit_gyro_z",
+    "HR": "emotibit_heart_rate",
+    "BI": "emotibit_inter_beat",
+    "MX": "emotibit_magno_x",
+    "MY": "emotibit_magno_y",
+    "MZ": "emotibit_magno_z",
+    "PG": "emotibit_ppg_green",
+    "PI": "emotibit_ppg_infrared",
+    "PR": "emotibit_ppg_red",
+    "SA": "emotibit_skin_con_amp",
+    "SF": "emotibit_skin_con_freq",
+    "SR": "emotibit_skin_con_rise",
+    "T1": "emotibit_temp",
+}
+BATCH_SIZE = 1000  # safe + fast for Supabase
+ENSURE_PARTITIONS = True  # create monthly partitions before inserting (see SQL_commands)
+REFRESH_ROLLUPS = True    # rebuild 1s/10s/1min rollups for each file's span after inserting
+QUALITY_FILTER = True     # drop duplicate/out-of-order/low-reliability rows, upload gap spans
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+# "rest": JSON inserts through PostgREST (default)
+# "copy": COPY ... FROM STDIN over a direct Postgres connection (needs psycopg + DATABASE_URL);
+#         falls back to "rest" when either is missing or a COPY fails
+INGEST_BACKEND = os.getenv("INGEST_BACKEND", "rest")
+COPY_FORMAT = os.getenv("COPY_FORMAT", "binary")  # "binary" | "text"
+DATABASE_URL = os.getenv("DATABASE_URL")  # Supabase: Settings -> Database -> Connection string
 
-BASE_DIR = "emotibit_SD_data"
-BATCH_SIZE = 1000  # safe + fast for Supabase
+PG_EPOCH = pd.Timestamp("2000-01-01", tz="UTC")
+PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + (0).to_bytes(4, "big") + (0).to_bytes(4, "big")
+PGCOPY_TRAILER = (-1).to_bytes(2, "big", signed=True)
 
-PACIFIC_TZ = ZoneInfo("America/Los_Angeles")
+_pg_conn = None
 
 
 def extract_device_id(info_json_path):
@@ -29,121 +62,214 @@ def extract_device_id(info_json_path):
     # EmotiBit schema: first list item → info → device_id
     return data[0]["info"]["device_id"]
 
-def ingest_csv(csv_path, device_id, data_col, supabase_table):
+def get_pg_conn():
+    """
+    Lazily open the direct Postgres connection for the COPY backend.
+    Returns None (REST fallback) when psycopg or DATABASE_URL is unavailable or the
+    connection can't be opened.
+    """
+    global _pg_conn, INGEST_BACKEND
+    if _pg_conn is not None and not _pg_conn.closed:
+        return _pg_conn
+    _pg_conn = None
+
+    try:
+        import psycopg
+    except ImportError:
+        print("INGEST_BACKEND=copy needs psycopg (pip install 'psycopg[binary]'); using REST")
+        INGEST_BACKEND = "rest"
+        return None
+    if not DATABASE_URL:
+        print("INGEST_BACKEND=copy needs DATABASE_URL; using REST")
+        INGEST_BACKEND = "rest"
+        return None
+
+    try:
+        _pg_conn = psycopg.connect(DATABASE_URL)
+    except psycopg.Error as e:
+        print(f"Could not connect to DATABASE_URL ({e!r}); using REST")
+        INGEST_BACKEND = "rest"
+        return None
+    return _pg_conn
+
+
+def copy_text_buffer(df, device_id, data_col) -> bytes:
+    # Tab-separated rows for COPY ... (FORMAT text)
+    out = pd.DataFrame({
+        "device_id": device_id,
+        "recorded_at": df["recorded_at"].dt.strftime("%Y-%m-%d %H:%M:%S.%f%z"),
+        "value": df[data_col].astype(float),
+    })
+    buf = io.StringIO()
+    out.to_csv(buf, sep="\t", header=False, index=False, lineterminator="\n")
+    return buf.getvalue().encode("utf-8")
+
+
+def copy_binary_buffer(df, device_id, data_col) -> bytes:
+    """
+    PGCOPY binary stream for (device_id text, recorded_at timestamptz, value float8).
+    device_id is constant per file, so every tuple has the same size and the whole
+    body is one big-endian numpy structured array.
+    """
+    dev = device_id.encode("utf-8")
+    tuple_dtype = np.dtype([
+        ("nfields", ">i2"),
+        ("dev_len", ">i4"), ("dev", f"S{len(dev)}"),
+        ("ts_len", ">i4"), ("ts", ">i8"),        # microseconds since 2000-01-01 UTC
+        ("val_len", ">i4"), ("val", ">f8"),
+    ])
+
+    rows = np.empty(len(df), dtype=tuple_dtype)
+    rows["nfields"] = 3
+    rows["dev_len"] = len(dev)
+    rows["dev"] = dev
+    rows["ts_len"] = 8
+    rows["ts"] = (df["recorded_at"] - PG_EPOCH) // pd.Timedelta(microseconds=1)
+    rows["val_len"] = 8
+    rows["val"] = df[data_col].to_numpy(dtype=float)
+
+    return PGCOPY_HEADER + rows.tobytes() + PGCOPY_TRAILER
+
+
+def copy_ingest(df, device_id, data_col, supabase_table) -> bool:
+    global _pg_conn
+    conn = get_pg_conn()
+    if conn is None:
+        return False
+
+    if COPY_FORMAT == "binary":
+        payload = copy_binary_buffer(df, device_id, data_col)
+        options = "(FORMAT binary)"
+    else:
+        payload = copy_text_buffer(df, device_id, data_col)
+        options = "(FORMAT text)"
+
+    sql = f"COPY public.{supabase_table} (device_id, recorded_at, value) FROM STDIN {options}"
+    try:
+        with conn.cursor() as cur:
+            with cur.copy(sql) as copy:
+                copy.write(payload)
+        conn.commit()
+    except Exception as e:
+        print(f"COPY into {supabase_table} failed ({e!r}); using REST for this file")
+        if conn.closed:
+            # Dropped connection: reconnect on the next file
+            _pg_conn = None
+        else:
+            conn.rollback()
+        return False
+    return True
+
+
+def ingest_csv(csv_path, device_id, data_col, supabase_table, clock_map=None):
     df = pd.read_csv(csv_path)
 
-    # Interpret LocalTimestamp as PST/PDT (NOT UTC)
-    df["recorded_at"] = df["LocalTimestamp"].apply(
-        lambda ts: datetime.fromtimestamp(ts, tz=PACIFIC_TZ)
-    )
+    # Map EmotiBitTimestamp through the session's clock map (falls back to
+    # LocalTimestamp); both are interpreted as PST/PDT (NOT UTC)
+    df["recorded_at"] = aligned_timestamps(df, clock_map)
 
-    records = [
-        {
-            "device_id": device_id,
-            "recorded_at": row["recorded_at"].isoformat(),
-            "value": float(row[data_col]),
-        }
-        for _, row in df.iterrows()
-    ]
+    if QUALITY_FILTER:
+        session = os.path.basename(csv_path)[: -len(f"_{data_col}.csv")]
+        signal = supabase_table[len("emotibit_"):]
+        df, gaps, summary = coverage_map(df, data_col, device_id, signal, session)
 
-    for i in range(0, len(records), BATCH_SIZE):
-        batch = records[i : i + BATCH_SIZE]
-        supabase.table(supabase_table).insert(batch).execute()
+        dropped = ", ".join(f"{k}={v}" for k, v in summary["dropped"].items() if v)
+        print(
+            f"{session} {data_col}: kept {summary['kept']}/{summary['rows']}"
+            f"{f' ({dropped})' if dropped else ''}, {summary['gaps']} gaps, coverage {summary['coverage']:.1%}"
+        )
 
+        if len(gaps):
+            gap_records = [
+                {
+                    **row,
+                    "start_at": row["start_at"].isoformat(),
+                    "end_at": row["end_at"].isoformat(),
+                }
+                for row in gaps.to_dict("records")
+            ]
+            get_supabase().table("emotibit_coverage").upsert(
+                gap_records, on_conflict="device_id,signal,start_at"
+            ).execute()
+
+        if summary["start_at"] is not None:
+            get_supabase().table("emotibit_recording_spans").upsert(
+                {
+                    "device_id": device_id,
+                    "signal": signal,
+                    "session": session,
+                    "start_at": summary["start_at"].isoformat(),
+                    "end_at": summary["end_at"].isoformat(),
+                },
+                on_conflict="device_id,signal,session",
+            ).execute()
+
+    # Make sure this file's months have their own partitions (not the default one)
+    if ENSURE_PARTITIONS and len(df):
+        ensure_partitions(df["recorded_at"].min(), df["recorded_at"].max(), supabase_table)
+
+    if not (INGEST_BACKEND == "copy" and copy_ingest(df, device_id, data_col, supabase_table)):
+        records = [
+            {
+                "device_id": device_id,
+                "recorded_at": row["recorded_at"].isoformat(),
+                "value": float(row[data_col]),
+            }
+            for _, row in df.iterrows()
+        ]
+
+        for i in range(0, len(records), BATCH_SIZE):
+            batch = records[i : i + BATCH_SIZE]
+            get_supabase().table(supabase_table).insert(batch).execute()
+
+    if REFRESH_ROLLUPS and len(df):
+        refresh_rollups(supabase_table, df["recorded_at"].min(), df["recorded_at"].max())
 
-def process_user_folder(folder_path):
-    info_json = None
-    ax_csv = None
-    ay_csv = None
-    az_csv = None
-    eda_csv = None
-    edl_csv = None
-    gyro_x_csv = None
-    gyro_y_csv = None
-    gyro_z_csv = None
-    hr_csv = None
-    bi_csv = None
-    mx_csv = None
-    my_csv = None
-    mz_csv = None
-    pg_csv = None
-    pi_csv = None
-    pr_csv = None
-    sa_csv = None
-    sf_csv = None
-    sr_csv = None
-    t1_csv = None
 
+def session_files(folder_path):
+    """
+    Group a folder's SD card files by session prefix:
+    {prefix: {"info": info.json path, "AX": AX csv path, ...}}.
+    EmotiBitTimestamp restarts at every boot, so files from different sessions must
+    never share a clock map.
+    """
+    sessions = {}
     for file in os.listdir(folder_path):
+        path = os.path.join(folder_path, file)
         if file.endswith("_info.json"):
-            info_json = os.path.join(folder_path, file)
-        elif file.endswith("_AX.csv"):
-            ax_csv = os.path.join(folder_path, file)
-        elif file.endswith("_AY.csv"):
-            ay_csv = os.path.join(folder_path, file)
-        elif file.endswith("_AZ.csv"):
-            az_csv = os.path.join(folder_path, file)
-        elif file.endswith("_EA.csv"):
-            eda_csv = os.path.join(folder_path, file)
-        elif file.endswith("_EL.csv"):
-            edl_csv = os.path.join(folder_path, file)
-        elif file.endswith("_GX.csv"):
-            gyro_x_csv = os.path.join(folder_path, file)
-        elif file.endswith("_GY.csv"):
-            gyro_y_csv = os.path.join(folder_path, file)
-        elif file.endswith("_GZ.csv"):
-            gyro_z_csv = os.path.join(folder_path, file)
-        elif file.endswith("_HR.csv"):
-            hr_csv = os.path.join(folder_path, file)
-        elif file.endswith("_BI.csv"):
-            bi_csv = os.path.join(folder_path, file)
-        elif file.endswith("_MX.csv"):
-            mx_csv = os.path.join(folder_path, file)
-        elif file.endswith("_MY.csv"):
-            my_csv = os.path.join(folder_path, file)
-        elif file.endswith("_MZ.csv"):
-            mz_csv = os.path.join(folder_path, file)
-        elif file.endswith("_PG.csv"):
-            pg_csv = os.path.join(folder_path, file)
-        elif file.endswith("_PI.csv"):
-            pi_csv = os.path.join(folder_path, file)
-        elif file.endswith("_PR.csv"):
-            pr_csv = os.path.join(folder_path, file)
-        elif file.endswith("_SA.csv"):
-            sa_csv = os.path.join(folder_path, file)
-        elif file.endswith("_SF.csv"):
-            sf_csv = os.path.join(folder_path, file)
-        elif file.endswith("_SR.csv"):
-            sr_csv = os.path.join(folder_path, file)
-        elif file.endswith("_T1.csv"):
-            t1_csv = os.path.join(folder_path, file)
-
-    device_id = extract_device_id(info_json)
-    ingest_csv(ax_csv, device_id, "AX", "emotibit_ax")
-    ingest_csv(ay_csv, device_id, "AY", "emotibit_ay")
-    ingest_csv(az_csv, device_id, "AZ", "emotibit_az")
-    ingest_csv(eda_csv, device_id, "EA", "emotibit_eda")
-    ingest_csv(edl_csv, device_id, "EL", "emotibit_edl")
-    ingest_csv(gyro_x_csv, device_id, "GX", "emotibit_gyro_x")
-    ingest_csv(gyro_y_csv, device_id, "GY", "emotibit_gyro_y")
-    ingest_csv(gyro_z_csv, device_id, "GZ", "emotibit_gyro_z")
-    ingest_csv(hr_csv, device_id, "HR", "emotibit_heart_rate")
-    ingest_csv(bi_csv, device_id, "BI", "emotibit_inter_beat")
-    ingest_csv(mx_csv, device_id, "MX", "emotibit_magno_x")
-    ingest_csv(my_csv, device_id, "MY", "emotibit_magno_y")
-    ingest_csv(mz_csv, device_id, "MZ", "emotibit_magno_z")
-    ingest_csv(pg_csv, device_id, "PG", "emotibit_ppg_green")
-    ingest_csv(pi_csv, device_id, "PI", "emotibit_ppg_infrared")
-    ingest_csv(pr_csv, device_id, "PR", "emotibit_ppg_red")
-    ingest_csv(sa_csv, device_id, "SA", "emotibit_skin_con_amp")
-    ingest_csv(sf_csv, device_id, "SF", "emotibit_skin_con_freq")
-    ingest_csv(sr_csv, device_id, "SR", "emotibit_skin_con_rise")
-    ingest_csv(t1_csv, device_id, "T1", "emotibit_temp")
-
-
-def main():
-    for entry in os.listdir(BASE_DIR):
-        folder_path = os.path.join(BASE_DIR, entry)
+            sessions.setdefault(file[: -len("_info.json")], {})["info"] = path
+            continue
+        for tag in CHANNEL_TABLES:
+            if file.endswith(f"_{tag}.csv"):
+                sessions.setdefault(file[: -len(f"_{tag}.csv")], {})[tag] = path
+                break
+    return sessions
+
+
+def process_user_folder(folder_path):
+    for prefix, files in sorted(session_files(folder_path).items()):
+        info_json = files.get("info")
+        if info_json is None:
+            print(f"{prefix}: no _info.json, skipped")
+            continue
+
+        device_id = extract_device_id(info_json)
+
+        # Fit the device -> wall clock mapping once per session, shared by its channels
+        clock_map = load_clock_map(info_json)
+        if clock_map is None:
+            print(f"{prefix}: no usable time sync, using LocalTimestamp")
+        else:
+            print(f"{prefix}: {clock_map}")
+
+        for tag, table in CHANNEL_TABLES.items():
+            if tag in files:
+                ingest_csv(files[tag], device_id, tag, table, clock_map)
+
+
+def main(base_dir=BASE_DIR):
+    for entry in os.listdir(base_dir):
+        folder_path = os.path.join(base_dir, entry)
         if os.path.isdir(folder_path):
             process_user_folder(folder_path)
 
@@ -0,0 +1,79 @@
+import argparse
+import pandas as pd
+
+from supabase_client import get_supabase
+
+
+MONTHS_AHEAD = 3  # keep this many future months pre-created
+
+
+def _iso(ts) -> str:
+    return pd.Timestamp(ts).isoformat()
+
+
+def ensure_partitions(start, end, table=None):
+    """
+    Create any missing monthly partitions covering [start, end] for every emotibit_*
+    table (or only `table`). Returns the names of partitions created.
+    """
+    res = get_supabase().rpc(
+        "emotibit_create_monthly_partitions",
+        {"p_from": _iso(start), "p_to": _iso(end), "p_table": table},
+    ).execute()
+    return [r if isinstance(r, str) else next(iter(r.values())) for r in (res.data or [])]
+
+
+def detach_partitions_before(before, drop=False, table=None):
+    """
+    Detach monthly partitions ending on or before `before`. Detached partitions remain
+    as plain tables (archive with pg_dump, then drop) unless drop=True.
+    """
+    res = get_supabase().rpc(
+        "emotibit_detach_partitions_before",
+        {"p_before": _iso(before), "p_drop": drop, "p_table": table},
+    ).execute()
+    return [r if isinstance(r, str) else next(iter(r.values())) for r in (res.data or [])]
+
+
+def list_partitions() -> pd.DataFrame:
+    res = get_supabase().rpc("emotibit_list_partitions", {}).execute()
+    return pd.DataFrame(res.data or [], columns=["parent", "partition", "bounds", "approx_rows", "total_bytes"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage monthly partitions of the emotibit_* tables")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_ensure = sub.add_parser("ensure", help="create partitions from --start through now + --months-ahead")
+    p_ensure.add_argument("--start", default=None, help="first month to cover (default: now)")
+    p_ensure.add_argument("--months-ahead", type=int, default=MONTHS_AHEAD)
+    p_ensure.add_argument("--table", default=None)
+
+    p_detach = sub.add_parser("detach", help="detach partitions that end on or before --before")
+    p_detach.add_argument("--before", required=True, help="e.g. 2025-07-01")
+    p_detach.add_argument("--drop", action="store_true", help="drop instead of keeping for archive")
+    p_detach.add_argument("--table", default=None)
+
+    sub.add_parser("list", help="show partitions with approximate rows and size")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "ensure":
+        now = pd.Timestamp.now(tz="UTC")
+        start = pd.Timestamp(args.start, tz="UTC") if args.start else now
+        created = ensure_partitions(start, now + pd.DateOffset(months=args.months_ahead), args.table)
+        print(f"Created {len(created)} partitions")
+        for name in created:
+            print(f"  {name}")
+    elif args.command == "detach":
+        detached = detach_partitions_before(pd.Timestamp(args.before, tz="UTC"), args.drop, args.table)
+        print(f"{'Dropped' if args.drop else 'Detached'} {len(detached)} partitions")
+        for name in detached:
+            print(f"  {name}")
+    else:
+        df = list_partitions()
+        print(df.to_string(index=False) if not df.empty else "No partitions found.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+
+# Rows below this DataReliability (0-100) are dropped
+MIN_RELIABILITY = 90
+
+# A dense channel has a gap wherever consecutive good samples are further apart than
+# GAP_FACTOR x its median sample spacing (and at least MIN_GAP_SECONDS)
+GAP_FACTOR = 5.0
+MIN_GAP_SECONDS = 0.5
+
+# Fixed-rate channels; the rest (HR, BI, SA, SF, SR, ...) are bursty by nature,
+# so long spacing there is not a gap
+DENSE_TAGS = {
+    "AX", "AY", "AZ",
+    "GX", "GY", "GZ",
+    "MX", "MY", "MZ",
+    "PG", "PI", "PR",
+    "EA", "EL",
+    "T1",
+}
+
+COVERAGE_COLUMNS = ["device_id", "signal", "session", "start_at", "end_at"]
+
+
+def quality_mask(df: pd.DataFrame, data_col: str):
+    """
+    Boolean mask of rows worth keeping, plus a count of rows dropped per reason.
+
+    - duplicate: same (EmotiBitTimestamp, PacketNumber) as an earlier row
+    - out_of_order: EmotiBitTimestamp earlier than a timestamp already seen
+      (PacketNumber wraps around, so ordering is judged on the device clock)
+    - low_reliability: DataReliability < MIN_RELIABILITY
+    - missing_value: empty value column
+    """
+    ts = df["EmotiBitTimestamp"]
+
+    duplicate = df.duplicated(["EmotiBitTimestamp", "PacketNumber"], keep="first")
+    out_of_order = (ts < ts.cummax().shift()) & ~duplicate
+    low_reliability = df["DataReliability"] < MIN_RELIABILITY
+    missing_value = df[data_col].isna()
+
+    reasons = {
+        "duplicate": duplicate,
+        "out_of_order": out_of_order,
+        "low_reliability": low_reliability,
+        "missing_value": missing_value,
+    }
+
+    bad = duplicate | out_of_order | low_reliability | missing_value
+    return ~bad, {k: int(v.sum()) for k, v in reasons.items()}
+
+
+def find_gaps(recorded_at: pd.Series) -> pd.DataFrame:
+    """
+    Gap spans (start_at = last good sample, end_at = next good sample) in a sorted,
+    timezone-aware timestamp series from one dense channel.
+    """
+    if len(recorded_at) < 3:
+        return pd.DataFrame(columns=["start_at", "end_at"])
+
+    seconds = (recorded_at - recorded_at.iloc[0]).dt.total_seconds().to_numpy()
+    dt = np.diff(seconds)
+    threshold = max(GAP_FACTOR * float(np.median(dt)), MIN_GAP_SECONDS)
+    idx = np.flatnonzero(dt > threshold)
+
+    return pd.DataFrame({
+        "start_at": recorded_at.iloc[idx].to_numpy(),
+        "end_at": recorded_at.iloc[idx + 1].to_numpy(),
+    })
+
+
+def coverage_map(df: pd.DataFrame, data_col: str, device_id: str, signal: str, session: str):
+    """
+    Run the quality stage on one channel of one session.
+
+    Returns (filtered df, gap rows for emotibit_coverage, summary dict). Gaps are
+    measured on the kept rows, so long runs of dropped packets show up as gaps.
+    """
+    keep, dropped = quality_mask(df, data_col)
+    good = df[keep]
+
+    gaps = pd.DataFrame(columns=COVERAGE_COLUMNS)
+    if data_col in DENSE_TAGS:
+        spans = find_gaps(good["recorded_at"].sort_values())
+        gaps = spans.assign(device_id=device_id, signal=signal, session=session)[COVERAGE_COLUMNS]
+
+    span = 0.0
+    if len(good) >= 2:
+        span = (good["recorded_at"].max() - good["recorded_at"].min()).total_seconds()
+    gap_seconds = float((gaps["end_at"] - gaps["start_at"]).dt.total_seconds().sum()) if len(gaps) else 0.0
+
+    summary = {
+        "rows": len(df),
+        "kept": len(good),
+        "dropped": dropped,
+        "gaps": len(gaps),
+        "coverage": (1.0 - gap_seconds / span) if span > 0 else 0.0,
+        # Recording extent, so gaps can be told apart from "this device wasn't on"
+        "start_at": good["recorded_at"].min() if len(good) else None,
+        "end_at": good["recorded_at"].max() if len(good) else None,
+    }
+    return good, gaps, summary
@@ -0,0 +1,90 @@
+import argparse
+import pandas as pd
+
+from supabase_client import get_supabase
+
+
+SIGNAL_TABLES = [
+    "emotibit_ax",
+    "emotibit_ay",
+    "emotibit_az",
+    "emotibit_eda",
+    "emotibit_edl",
+    "emotibit_gyro_x",
+    "emotibit_gyro_y",
+    "emotibit_gyro_z",
+    "emotibit_heart_rate",
+    "emotibit_humidity",
+    "emotibit_inter_beat",
+    "emotibit_magno_x",
+    "emotibit_magno_y",
+    "emotibit_magno_z",
+    "emotibit_ppg_green",
+    "emotibit_ppg_infrared",
+    "emotibit_ppg_red",
+    "emotibit_skin_con_amp",
+    "emotibit_skin_con_freq",
+    "emotibit_skin_con_rise",
+    "emotibit_temp",
+]
+
+MAX_POINTS = 2000  # per device; longer spans are served from coarser rollups
+ROLLUP_COLUMNS = ["resolution_seconds", "device_id", "bucket", "n", "mean", "min", "max"]
+
+
+def refresh_rollups(table: str, start, end) -> int:
+    """
+    Rebuild the 1s/10s/1min rollups of `table` for [start, end] (widened to whole
+    minutes). Returns the number of 1s buckets written.
+    """
+    res = get_supabase().rpc(
+        "emotibit_refresh_rollups",
+        {"p_table": table, "p_from": pd.Timestamp(start).isoformat(), "p_to": pd.Timestamp(end).isoformat()},
+    ).execute()
+    return int(res.data or 0)
+
+
+def query_rollups(table: str, start, end, device_id=None, max_points=MAX_POINTS) -> pd.DataFrame:
+    """
+    min/max/mean of `table` over [start, end) from the finest rollup level that
+    keeps at most `max_points` buckets per device.
+    """
+    res = get_supabase().rpc(
+        "emotibit_rollup_query",
+        {
+            "p_table": table,
+            "p_from": pd.Timestamp(start).isoformat(),
+            "p_to": pd.Timestamp(end).isoformat(),
+            "p_device_id": device_id,
+            "p_max_points": max_points,
+        },
+    ).execute()
+
+    df = pd.DataFrame(res.data or [], columns=ROLLUP_COLUMNS)
+    df["bucket"] = pd.to_datetime(df["bucket"], utc=True)
+    return df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain 1s/10s/1min rollups of the emotibit_* tables")
+    parser.add_argument("--since-hours", type=float, default=24.0,
+                        help="refresh buckets from this many hours ago until now")
+    parser.add_argument("--start", default=None, help="explicit start (overrides --since-hours)")
+    parser.add_argument("--end", default=None, help="explicit end (default: now)")
+    parser.add_argument("--table", default=None, help="only this table (default: all)")
+    args = parser.parse_args(argv)
+
+    end = pd.Timestamp(args.end, tz="UTC") if args.end else pd.Timestamp.now(tz="UTC")
+    start = pd.Timestamp(args.start, tz="UTC") if args.start else end - pd.Timedelta(hours=args.since_hours)
+
+    total = 0
+    for table in ([args.table] if args.table else SIGNAL_TABLES):
+        n = refresh_rollups(table, start, end)
+        total += n
+        print(f"{table}: {n} 1s buckets")
+
+    print(f"\nDone. Refreshed {total} 1s buckets between {start} and {end}.")
+
+
+if __name__ == "__main__":
+    main()
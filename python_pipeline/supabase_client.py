@@ -0,0 +1,21 @@
+import os
+from dotenv import load_dotenv
+
+
+# Load env vars
+load_dotenv()
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+
+_supabase = None
+
+
+def get_supabase():
+    """Shared service-role client, created on first use (supabase is slow to import)."""
+    global _supabase
+    if _supabase is None:
+        from supabase import create_client
+
+        _supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+    return _supabase
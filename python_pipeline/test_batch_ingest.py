@@ -0,0 +1,32 @@
+import os
+import shutil
+
+import batch_ingest
+from time_sync import load_clock_map
+
+SD_DIR = os.path.join(os.path.dirname(__file__), "emotibit_SD_data", "user_1")
+SESSIONS = ["2025-12-25_18-17-12-366661", "2025-12-26_14-24-00-564177"]
+
+
+def test_each_session_gets_its_own_clock_map(tmp_path, monkeypatch):
+    # Two sessions in one folder; time-sync files and one channel each
+    for session in SESSIONS:
+        for suffix in ("_info.json", "_timesyncs.csv", "_timeSyncMap.csv", "_AX.csv"):
+            src = os.path.join(SD_DIR, session + suffix)
+            if os.path.exists(src):
+                shutil.copy(src, tmp_path / (session + suffix))
+
+    calls = []
+    monkeypatch.setattr(
+        batch_ingest, "ingest_csv",
+        lambda csv_path, device_id, data_col, table, clock_map=None: calls.append((csv_path, clock_map)),
+    )
+
+    batch_ingest.process_user_folder(str(tmp_path))
+
+    assert sorted(os.path.basename(p) for p, _ in calls) == [s + "_AX.csv" for s in SESSIONS]
+    expected = {s: load_clock_map(str(tmp_path / (s + "_info.json"))) for s in SESSIONS}
+    assert expected[SESSIONS[0]].intercept != expected[SESSIONS[1]].intercept
+    for csv_path, clock_map in calls:
+        own = expected[os.path.basename(csv_path)[: -len("_AX.csv")]]
+        assert (clock_map.slope, clock_map.intercept) == (own.slope, own.intercept)
@@ -0,0 +1,131 @@
+import os
+import numpy as np
+import pandas as pd
+
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+
+PACIFIC_TZ = ZoneInfo("America/Los_Angeles")
+
+# EmotiBitTimestamp is device milliseconds; the nominal device -> wall slope is 1 ms = 1e-3 s.
+NOMINAL_SLOPE = 1e-3
+# Reject fitted slopes further than this from nominal (crystal drift is ppm, not percent)
+MAX_SLOPE_ERROR = 0.01
+# Only estimate drift (slope) when the syncs span at least this many seconds;
+# shorter spans give a slope dominated by round-trip jitter.
+MIN_DRIFT_SPAN_SECONDS = 600.0
+
+
+class ClockMap:
+    """
+    Linear EmotiBit-clock -> wall-clock mapping for one SD session:
+
+        wall_seconds = slope * emotibit_ms + intercept
+    """
+
+    def __init__(self, slope: float, intercept: float, source: str):
+        self.slope = slope
+        self.intercept = intercept
+        self.source = source
+
+    def to_wall(self, emotibit_ms) -> np.ndarray:
+        # Vectorized: accepts a scalar, list, numpy array or pandas Series
+        return self.slope * np.asarray(emotibit_ms, dtype=float) + self.intercept
+
+    def __repr__(self):
+        return f"ClockMap(slope={self.slope:.9f}, intercept={self.intercept:.6f}, source={self.source!r})"
+
+
+def session_prefix(info_json_path: str) -> str:
+    # ".../2025-12-25_18-17-12-366661_info.json" -> ".../2025-12-25_18-17-12-366661"
+    return info_json_path[: -len("_info.json")]
+
+
+def _parse_ts_sent(value: str) -> float:
+    # EmotiBit Oscilloscope writes host time as local "YYYY-MM-DD_HH-MM-SS-ffffff"
+    dt = datetime.strptime(value.strip(), "%Y-%m-%d_%H-%M-%S-%f")
+    return dt.replace(tzinfo=PACIFIC_TZ).timestamp()
+
+
+def _plausible(slope: float) -> bool:
+    return abs(slope / NOMINAL_SLOPE - 1.0) <= MAX_SLOPE_ERROR
+
+
+def fit_from_timesyncs(path: str):
+    """
+    Fit from the individual sync exchanges. Each complete row pairs the device time
+    the request was received (TS_received, ms) with the host send time (TS_sent);
+    half the round trip is added to the host time.
+    """
+    if not os.path.exists(path):
+        return None
+
+    df = pd.read_csv(path, usecols=["TS_received", "TS_sent", "RoundTrip"])
+    df = df.dropna()
+    if df.empty:
+        return None
+
+    te = df["TS_received"].to_numpy(dtype=float)
+    rt = df["RoundTrip"].to_numpy(dtype=float)
+    tl = np.array([_parse_ts_sent(v) for v in df["TS_sent"]]) + rt / 2000.0
+
+    span = (te.max() - te.min()) * NOMINAL_SLOPE
+    if len(te) >= 2 and span >= MIN_DRIFT_SPAN_SECONDS:
+        slope, intercept = np.polyfit(te, tl, 1)
+        if _plausible(slope):
+            return ClockMap(float(slope), float(intercept), "timesyncs:fit")
+
+    # Nominal slope; offset from the tightest exchange (smallest round trip)
+    best = int(np.argmin(rt))
+    return ClockMap(NOMINAL_SLOPE, float(tl[best] - NOMINAL_SLOPE * te[best]), "timesyncs:offset")
+
+
+def fit_from_time_sync_map(path: str):
+    """
+    Fit from the parser's two-point summary (TE0/TE1 device ms, TL0/TL1 wall seconds).
+    The map can carry a stale TE0/TL0 pair from an earlier session, so it is only
+    trusted when its slope is plausible.
+    """
+    if not os.path.exists(path):
+        return None
+
+    df = pd.read_csv(path, skipinitialspace=True)
+    if df.empty:
+        return None
+
+    row = df.iloc[0]
+    te0, te1, tl0, tl1 = (float(row[c]) for c in ("TE0", "TE1", "TL0", "TL1"))
+    if te1 == te0:
+        return None
+
+    slope = (tl1 - tl0) / (te1 - te0)
+    if not _plausible(slope):
+        return None
+    return ClockMap(slope, tl0 - slope * te0, "timeSyncMap")
+
+
+def load_clock_map(info_json_path: str):
+    """
+    Fit the device-to-wall-clock mapping once per session. Returns None when neither
+    time-sync file yields a usable mapping (callers fall back to LocalTimestamp).
+    """
+    prefix = session_prefix(info_json_path)
+    return (
+        fit_from_timesyncs(prefix + "_timesyncs.csv")
+        or fit_from_time_sync_map(prefix + "_timeSyncMap.csv")
+    )
+
+
+def aligned_timestamps(df: pd.DataFrame, clock_map=None) -> pd.Series:
+    """
+    Timezone-aware (Pacific) timestamps for every row of an EmotiBit CSV, mapped from
+    EmotiBitTimestamp through clock_map, or LocalTimestamp when no map is available.
+    """
+    if clock_map is not None and "EmotiBitTimestamp" in df.columns:
+        seconds = clock_map.to_wall(df["EmotiBitTimestamp"])
+    else:
+        seconds = df["LocalTimestamp"].to_numpy(dtype=float)
+
+    ts = pd.to_datetime(seconds, unit="s", utc=True).round("us")
+    return pd.Series(ts, index=df.index).dt.tz_convert(PACIFIC_TZ)
@@ -1,7 +1,6 @@
 import os
 import pandas as pd
 from dotenv import load_dotenv
-from supabase import create_client
 
 try:
     from tqdm import tqdm
@@ -16,16 +15,37 @@ load_dotenv()
 SUPABASE_URL = os.getenv("VITE_SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")  # service role bypasses RLS
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise RuntimeError("Missing VITE_SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY in .env")
-
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-
 OUT_DIR = "training_data"
-os.makedirs(OUT_DIR, exist_ok=True)
 
 PAGE_SIZE = 1000  # PostgREST default max per request is often 1000
 
+# "raw": every sample of every table (emotibit_<signal>.csv)
+# "aggregates": per-device window statistics computed in Postgres by
+#               emotibit_window_aggregates() (agg_emotibit_<signal>.csv)
+# "rollups": exploratory min/max/mean over EXPLORE_START..EXPLORE_END from the
+#            1s/10s/1min rollup tables (rollup_emotibit_<signal>.csv)
+EXTRACT_MODE = "raw"
+
+# Aggregates mode only; must match train_emotibit_model.py
+WINDOW_SECONDS = 10
+STRIDE_SECONDS = 5
+# Each emotibit_window_aggregates() call covers this much time (a multiple of
+# STRIDE_SECONDS), so the server only ever aggregates one span at a time.
+# 3600s = 720 windows per device, one page for a single device.
+AGG_SPAN_SECONDS = 3600
+
+# Rollups mode only; the coarsest level needed to stay under ROLLUP_MAX_POINTS per device is used
+EXPLORE_START = "2025-12-25T00:00:00Z"
+EXPLORE_END = "2026-01-01T00:00:00Z"
+ROLLUP_MAX_POINTS = 2000
+
+ROLLUP_COLUMNS = ["resolution_seconds", "device_id", "bucket", "n", "mean", "min", "max"]
+
+AGG_COLUMNS = [
+    "device_id", "window_start", "window_end", "n", "mean", "std",
+    "min", "max", "sum_sq", "last_value", "first_at", "last_at",
+]
+
 SIGNAL_TABLES = [
     "emotibit_ax",
     "emotibit_ay",
@@ -50,24 +70,42 @@ SIGNAL_TABLES = [
     "emotibit_temp",
 ]
 
+_supabase = None
+
 # -----------------------------
 # Helpers
 # -----------------------------
-def fetch_all_rows(table: str, columns: str, order_col: str, pbar=None):
+def get_supabase():
+    # Created on first use so importing this module stays cheap
+    global _supabase
+    if _supabase is None:
+        if not SUPABASE_URL or not SUPABASE_KEY:
+            raise RuntimeError("Missing VITE_SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY in .env")
+
+        from supabase import create_client
+
+        _supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+    return _supabase
+
+
+def fetch_all_rows(table: str, columns: str, order_col: str, pbar=None, rpc_params=None):
     """
     Fetch all rows from a table with pagination using .range().
+    If rpc_params is given, `table` names a set-returning function called via RPC.
     If pbar is provided, updates progress by number of rows fetched.
     """
     all_rows = []
     offset = 0
 
     while True:
-        q = (
-            supabase.table(table)
-            .select(columns)
-            .order(order_col, desc=False)
-            .range(offset, offset + PAGE_SIZE - 1)
-        )
+        if rpc_params is not None:
+            q = get_supabase().rpc(table, rpc_params).select(columns)
+        else:
+            q = get_supabase().table(table).select(columns)
+
+        for col in ([order_col] if isinstance(order_col, str) else order_col):
+            q = q.order(col, desc=False)
+        q = q.range(offset, offset + PAGE_SIZE - 1)
 
         res = q.execute()
         page = res.data or []
@@ -89,7 +127,7 @@ def fetch_all_rows(table: str, columns: str, order_col: str, pbar=None):
 
 
 
-def export_signal_table(table: str):
+def export_signal_table(table: str, out_dir: str = OUT_DIR):
     # Create a per-table row progress bar (unknown total)
     row_pbar = None
     if tqdm:
@@ -112,12 +150,150 @@ def export_signal_table(table: str):
         .dt.strftime("%Y-%m-%d %H:%M:%S.%f%z")
     )
 
-    out_path = os.path.join(OUT_DIR, f"{table}.csv")
+    out_path = os.path.join(out_dir, f"{table}.csv")
+    df.to_csv(out_path, index=False)
+    return len(df), out_path
+
+
+def first_recorded_at(table: str, device_ids, after=None):
+    """
+    Earliest recorded_at in `table` (at or after `after`), or None. Probed per device
+    so each lookup is a short scan of the (device_id, recorded_at) index; an
+    unfiltered order-by-recorded_at would sort every remaining row.
+    """
+    first = None
+    for device_id in device_ids:
+        q = get_supabase().table(table).select("recorded_at").eq("device_id", device_id)
+        if after is not None:
+            q = q.gte("recorded_at", after.isoformat())
+        res = q.order("recorded_at", desc=False).limit(1).execute()
+        if res.data:
+            t = pd.Timestamp(res.data[0]["recorded_at"]).tz_convert("UTC")
+            first = t if first is None else min(first, t)
+    return first
+
+
+def export_signal_aggregates(table: str, out_dir: str = OUT_DIR):
+    """
+    Fetch windows one AGG_SPAN_SECONDS span at a time (p_start/p_end), so Postgres
+    only aggregates that span; empty stretches are skipped via first_recorded_at().
+    Each span keeps the windows starting in [lo, hi) and reads WINDOW - STRIDE past
+    hi so those windows are complete.
+    """
+    row_pbar = None
+    if tqdm:
+        row_pbar = tqdm(desc=f"Aggregating {table}", unit="windows", leave=False)
+
+    stride = pd.Timedelta(seconds=STRIDE_SECONDS)
+    span = pd.Timedelta(seconds=AGG_SPAN_SECONDS)
+    overhang = pd.Timedelta(seconds=WINDOW_SECONDS - STRIDE_SECONDS)
+
+    device_ids = [r["device_id"] for r in fetch_all_rows("emotibit_devices", "device_id", "device_id")]
+
+    frames = []
+    prev_hi = None
+    t = first_recorded_at(table, device_ids)
+    while t is not None:
+        # Align to the stride grid emotibit_window_aggregates() bins on (epoch based)
+        span_start = pd.Timestamp(0, tz="UTC") + ((t - pd.Timestamp(0, tz="UTC")) // stride) * stride
+        hi = span_start + span
+        lo = span_start - overhang if prev_hi is None else max(prev_hi, span_start - overhang)
+
+        rows = fetch_all_rows(
+            table="emotibit_window_aggregates",
+            columns=",".join(AGG_COLUMNS),
+            order_col=["window_start", "device_id"],
+            rpc_params={
+                "p_table": table,
+                "p_window_seconds": WINDOW_SECONDS,
+                "p_stride_seconds": STRIDE_SECONDS,
+                "p_start": span_start.isoformat(),
+                "p_end": (hi + overhang).isoformat(),
+            },
+        )
+
+        df = pd.DataFrame(rows, columns=AGG_COLUMNS)
+        starts = pd.to_datetime(df["window_start"], utc=True)
+        df = df[(starts >= lo) & (starts < hi)]
+        frames.append(df)
+
+        if row_pbar is not None:
+            row_pbar.update(len(df))
+
+        prev_hi = hi
+        t = first_recorded_at(table, device_ids, after=hi)
+
+    if row_pbar is not None:
+        row_pbar.close()
+
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=AGG_COLUMNS)
+
+    for col in ("window_start", "window_end", "first_at", "last_at"):
+        df[col] = (
+            pd.to_datetime(df[col], utc=True)
+            .dt.strftime("%Y-%m-%d %H:%M:%S.%f%z")
+        )
+
+    out_path = os.path.join(out_dir, f"agg_{table}.csv")
     df.to_csv(out_path, index=False)
     return len(df), out_path
 
 
-def export_label_intervals():
+def export_signal_rollups(table: str, out_dir: str = OUT_DIR):
+    rows = fetch_all_rows(
+        table="emotibit_rollup_query",
+        columns=",".join(ROLLUP_COLUMNS),
+        order_col=["device_id", "bucket"],
+        rpc_params={
+            "p_table": table,
+            "p_from": EXPLORE_START,
+            "p_to": EXPLORE_END,
+            "p_max_points": ROLLUP_MAX_POINTS,
+        },
+    )
+
+    df = pd.DataFrame(rows, columns=ROLLUP_COLUMNS)
+    df["bucket"] = (
+        pd.to_datetime(df["bucket"], utc=True)
+        .dt.strftime("%Y-%m-%d %H:%M:%S.%f%z")
+    )
+
+    out_path = os.path.join(out_dir, f"rollup_{table}.csv")
+    df.to_csv(out_path, index=False)
+    return len(df), out_path
+
+
+def export_coverage(out_dir: str = OUT_DIR):
+    # Gap spans from batch_ingest's quality stage; small, always exported
+    rows = fetch_all_rows(
+        table="emotibit_coverage",
+        columns="device_id,signal,start_at,end_at",
+        order_col="start_at",
+    )
+
+    df = pd.DataFrame(rows, columns=["device_id", "signal", "start_at", "end_at"])
+
+    out_path = os.path.join(out_dir, "coverage.csv")
+    df.to_csv(out_path, index=False)
+    return len(df), out_path
+
+
+def export_recording_spans(out_dir: str = OUT_DIR):
+    # When each device was recording; tells the trainer which devices' gaps count
+    rows = fetch_all_rows(
+        table="emotibit_recording_spans",
+        columns="device_id,signal,start_at,end_at",
+        order_col="start_at",
+    )
+
+    df = pd.DataFrame(rows, columns=["device_id", "signal", "start_at", "end_at"])
+
+    out_path = os.path.join(out_dir, "recording_spans.csv")
+    df.to_csv(out_path, index=False)
+    return len(df), out_path
+
+
+def export_label_intervals(out_dir: str = OUT_DIR):
     # Leverage FK relationship: user_states.label_id -> labels.id
     # This nested select is supported by Supabase/PostgREST when FK exists.
     rows = fetch_all_rows(
@@ -144,29 +320,44 @@ def export_label_intervals():
     # Ensure column order
     df = df[["user_id", "form_id", "started_at", "ended_at", "label_name"]]
 
-    out_path = os.path.join(OUT_DIR, "label_intervals.csv")
+    out_path = os.path.join(out_dir, "label_intervals.csv")
     df.to_csv(out_path, index=False)
     return len(df), out_path
 
 
-def main():
+def main(out_dir: str = OUT_DIR, mode: str = EXTRACT_MODE):
+    os.makedirs(out_dir, exist_ok=True)
     total_exported = 0
 
     iterator = SIGNAL_TABLES
     if tqdm:
         iterator = tqdm(SIGNAL_TABLES, desc="Exporting signal tables", unit="table")
 
+    export = {
+        "raw": export_signal_table,
+        "aggregates": export_signal_aggregates,
+        "rollups": export_signal_rollups,
+    }[mode]
+
     for table in iterator:
-        n, path = export_signal_table(table)
+        n, path = export(table, out_dir)
         total_exported += n
         if not tqdm:
             print(f"{table}: {n} rows -> {path}")
 
-    n_labels, path_labels = export_label_intervals()
+    n_labels, path_labels = export_label_intervals(out_dir)
     if not tqdm:
         print(f"label_intervals: {n_labels} rows -> {path_labels}")
 
-    print(f"\nDone. Exported {total_exported} signal rows + {n_labels} label rows into '{OUT_DIR}/'.")
+    n_gaps, path_gaps = export_coverage(out_dir)
+    if not tqdm:
+        print(f"coverage: {n_gaps} gap spans -> {path_gaps}")
+
+    n_spans, path_spans = export_recording_spans(out_dir)
+    if not tqdm:
+        print(f"recording_spans: {n_spans} spans -> {path_spans}")
+
+    print(f"\nDone. Exported {total_exported} signal rows ({mode}) + {n_labels} label rows into '{out_dir}/'.")
 
 
 if __name__ == "__main__":
@@ -1,9 +1,12 @@
-from pylsl import resolve_streams, StreamInlet, local_clock
 import pandas as pd
 import numpy as np
+import os
 import time
-import joblib
+import json
+import threading
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 # -------------------------
 # CONFIG
@@ -11,6 +14,15 @@ from collections import deque
 WINDOW_SECONDS = 10.0
 STRIDE_SECONDS = 5.0
 SLEEP_SECONDS = 0.01
+MODEL_DIR = "models"
+
+# During the first stride, until a prediction succeeds, retry this often instead of
+# waiting the full stride (dense signals reach min_samples ~2s after streams connect)
+WARMUP_RETRY_SECONDS = 0.5
+
+# Map every inlet's timestamps onto this machine's local_clock() (LSL time correction),
+# so all streams share the timeline that pruning and windowing compare against
+LSL_CLOCK_SYNC = True
 
 # Map LSL stream name -> training signal name
 LSL_TO_SIGNAL = {
@@ -47,52 +59,282 @@ SPARSE_SIGNALS = {"heart_rate", "skin_con_amp", "skin_con_freq", "skin_con_rise"
 
 PRINT_BUFFER_HEALTH_EVERY = 1  # strides; set 0 to disable
 PRINT_SKIP_REASONS = True
+MAX_SAMPLES_PER_PULL = 512
+
+# Metrics (latency histograms, per-stream rates, late samples, inference lag)
+METRICS_HTTP_PORT = None            # e.g. 9108 -> Prometheus text on http://127.0.0.1:9108/metrics
+METRICS_JSON_PATH = None            # e.g. "metrics/realtime_metrics.json"; rewritten periodically
+METRICS_DUMP_EVERY_SECONDS = 30.0
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
 
 # -------------------------
 # LOAD MODEL
 # -------------------------
-clf = joblib.load("models/emotibit_activity_model.joblib")
-le = joblib.load("models/label_encoder.joblib")
+def load_model(model_dir: str = MODEL_DIR):
+    """
+    Load classifier + label encoder and return (clf, le, feature_order).
+    Runs one throwaway prediction so the first real one doesn't pay for
+    sklearn/joblib warm-up.
+    """
+    import joblib
+
+    clf = joblib.load(os.path.join(model_dir, "emotibit_activity_model.joblib"))
+    le = joblib.load(os.path.join(model_dir, "label_encoder.joblib"))
+
+    feature_order = list(getattr(clf, "feature_names_in_", []))
+    if not feature_order:
+        raise RuntimeError("Model missing feature_names_in_. Retrain with sklearn>=1.0 or save feature list manually.")
+
+    X = pd.DataFrame([[0.0] * len(feature_order)], columns=feature_order)
+    clf.predict(X)
+    if hasattr(clf, "predict_proba"):
+        clf.predict_proba(X)
 
-FEATURE_ORDER = list(getattr(clf, "feature_names_in_", []))
-if not FEATURE_ORDER:
-    raise RuntimeError("Model missing feature_names_in_. Retrain with sklearn>=1.0 or save feature list manually.")
+    return clf, le, feature_order
 
 # -------------------------
-# BUFFERS
+# METRICS
 # -------------------------
-# buffers store (lsl_ts, value)
-buffers = {lsl: deque() for lsl in LSL_TO_SIGNAL.keys()}
-last_pred_t = 0.0
-stride_count = 0
+class Histogram:
+    """Cumulative-bucket latency histogram (Prometheus semantics)."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+        for i, b in enumerate(self.buckets):
+            if value <= b:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self):
+        out, running = [], 0
+        for b, c in zip(self.buckets, self.counts):
+            running += c
+            out.append((b, running))
+        return out
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": (self.sum / self.count) if self.count else None,
+            "max": self.max,
+            "buckets": {str(b): c for b, c in self.cumulative()},
+        }
+
+
+class Metrics:
+    """
+    In-process metrics for the inference loop.
+
+    Stages timed per stride: pull, prune, features, predict, and the whole stride.
+    Per stream: samples received, late samples (already older than the window on
+    arrival, so pruned without ever being used) and saturated pulls (pull_chunk
+    returned MAX_SAMPLES_PER_PULL, i.e. the inlet has a backlog).
+    Inference lag: how long after the stride was due the prediction finished.
+    """
+
+    STAGES = ("pull", "prune", "features", "predict", "stride")
+
+    def __init__(self, stream_names):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.stage_latency = {stage: Histogram() for stage in self.STAGES}
+        self.inference_lag = Histogram()
+        self.samples = {name: 0 for name in stream_names}
+        self.late_samples = {name: 0 for name in stream_names}
+        self.saturated_pulls = {name: 0 for name in stream_names}
+        self.predictions = 0
+        self.skipped = 0
+        self.errors = 0
+        self.first_prediction_seconds = None  # since process start
+        # rate window for samples/sec
+        self._rate_t0 = time.monotonic()
+        self._rate_samples0 = dict(self.samples)
+        self.samples_per_sec = {name: 0.0 for name in stream_names}
+
+    def observe_stage(self, stage: str, seconds: float):
+        with self.lock:
+            self.stage_latency[stage].observe(seconds)
+
+    def observe_lag(self, seconds: float):
+        with self.lock:
+            self.inference_lag.observe(max(seconds, 0.0))
+
+    def add_samples(self, stream_name: str, n: int, late: int, saturated: bool):
+        with self.lock:
+            self.samples[stream_name] += n
+            self.late_samples[stream_name] += late
+            if saturated:
+                self.saturated_pulls[stream_name] += 1
+
+    def count(self, outcome: str):
+        with self.lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def update_rates(self):
+        with self.lock:
+            now = time.monotonic()
+            elapsed = now - self._rate_t0
+            if elapsed <= 0:
+                return
+            for name, total in self.samples.items():
+                self.samples_per_sec[name] = (total - self._rate_samples0[name]) / elapsed
+            self._rate_t0 = now
+            self._rate_samples0 = dict(self.samples)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "timestamp": time.time(),
+                "uptime_seconds": time.time() - self.started,
+                "stride_seconds": STRIDE_SECONDS,
+                "predictions": self.predictions,
+                "skipped": self.skipped,
+                "errors": self.errors,
+                "first_prediction_seconds": self.first_prediction_seconds,
+                "stage_latency_seconds": {k: h.to_dict() for k, h in self.stage_latency.items()},
+                "inference_lag_seconds": self.inference_lag.to_dict(),
+                "streams": {
+                    name: {
+                        "samples": self.samples[name],
+                        "samples_per_sec": self.samples_per_sec[name],
+                        "late_samples": self.late_samples[name],
+                        "saturated_pulls": self.saturated_pulls[name],
+                    }
+                    for name in self.samples
+                },
+            }
+
+    def prometheus(self) -> str:
+        snap = self.snapshot()
+        lines = []
+
+        def histogram(metric: str, help_text: str, label: str, hists: dict):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} histogram")
+            for key, h in hists.items():
+                sel = f'{label}="{key}",' if label else ""
+                for b, c in h.cumulative():
+                    lines.append(f'{metric}_bucket{{{sel}le="{b}"}} {c}')
+                lines.append(f'{metric}_bucket{{{sel}le="+Inf"}} {h.count}')
+                sel = f'{{{label}="{key}"}}' if label else ""
+                lines.append(f"{metric}_sum{sel} {h.sum}")
+                lines.append(f"{metric}_count{sel} {h.count}")
+
+        def per_stream(metric: str, kind: str, help_text: str, field: str):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {kind}")
+            for name, stats in snap["streams"].items():
+                lines.append(f'{metric}{{stream="{name}"}} {stats[field]}')
+
+        with self.lock:
+            histogram("rt_stage_latency_seconds", "Per-stage latency of the inference loop.",
+                      "stage", self.stage_latency)
+            histogram("rt_inference_lag_seconds", "Time between stride due and prediction done.",
+                      "", {"": self.inference_lag})
+
+        per_stream("rt_samples_total", "counter", "Samples received per stream.", "samples")
+        per_stream("rt_samples_per_second", "gauge", "Recent sample rate per stream.", "samples_per_sec")
+        per_stream("rt_late_samples_total", "counter",
+                   "Samples older than the window on arrival (dropped).", "late_samples")
+        per_stream("rt_saturated_pulls_total", "counter",
+                   "Pulls that hit MAX_SAMPLES_PER_PULL (inlet backlog).", "saturated_pulls")
+
+        for outcome in ("predictions", "skipped", "errors"):
+            lines.append(f"# TYPE rt_{outcome}_total counter")
+            lines.append(f"rt_{outcome}_total {snap[outcome]}")
+
+        if snap["first_prediction_seconds"] is not None:
+            lines.append("# TYPE rt_first_prediction_seconds gauge")
+            lines.append(f"rt_first_prediction_seconds {snap['first_prediction_seconds']}")
+
+        return "\n".join(lines) + "\n"
+
+    def dump_json(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp, path)
+
+
+def start_metrics_server(metrics: Metrics, port: int):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") in ("", "/metrics"):
+                body = metrics.prometheus().encode("utf-8")
+                ctype = "text/plain; version=0.0.4"
+            elif self.path.rstrip("/") == "/metrics.json":
+                body = json.dumps(metrics.snapshot()).encode("utf-8")
+                ctype = "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass  # keep the console for predictions
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Metrics on http://127.0.0.1:{port}/metrics")
+    return server
+
 
 # -------------------------
 # LSL SETUP
 # -------------------------
-streams = resolve_streams()
-inlets = []
+def connect_inlets():
+    from pylsl import resolve_streams, StreamInlet, proc_clocksync, proc_dejitter
+
+    streams = resolve_streams()
+    inlets = []
+
+    for s in streams:
+        if s.name() in LSL_TO_SIGNAL:
+            flags = (proc_clocksync | proc_dejitter) if LSL_CLOCK_SYNC else 0
+            inlet = StreamInlet(s, max_buflen=60, processing_flags=flags)
+            inlets.append((s.name(), inlet))
+            print(f"Connected to {s.name()} -> {LSL_TO_SIGNAL[s.name()]}")
 
-for s in streams:
-    if s.name() in LSL_TO_SIGNAL:
-        inlet = StreamInlet(s, max_buflen=60)
-        inlets.append((s.name(), inlet))
-        print(f"Connected to {s.name()} -> {LSL_TO_SIGNAL[s.name()]}")
+    if not inlets:
+        raise RuntimeError("No matching LSL streams found. Check stream names vs LSL_TO_SIGNAL keys.")
 
-if not inlets:
-    raise RuntimeError("No matching LSL streams found. Check stream names vs LSL_TO_SIGNAL keys.")
+    return inlets
 
-print("\n--- Realtime inference started ---\n")
+def lsl_puller(inlets):
+    """pull() for run(): one pull_chunk per inlet -> [(stream_name, chunk, timestamps)]."""
+    def pull():
+        return [
+            (stream_name, *inlet.pull_chunk(timeout=0.0, max_samples=MAX_SAMPLES_PER_PULL))
+            for stream_name, inlet in inlets
+        ]
+    return pull
 
 # -------------------------
 # HELPERS
 # -------------------------
-def prune_old(now_lsl: float):
+def prune_old(buffers: dict, now_lsl: float):
     cutoff = now_lsl - WINDOW_SECONDS
     for dq in buffers.values():
         while dq and dq[0][0] < cutoff:
             dq.popleft()
 
-def buffer_health(now_lsl: float) -> str:
+def buffer_health(buffers: dict, now_lsl: float) -> str:
     lines = [f"[STATUS] now_lsl={now_lsl:.3f} window={WINDOW_SECONDS:.1f}s"]
     for lsl_name, train_name in LSL_TO_SIGNAL.items():
         dq = buffers.get(lsl_name, deque())
@@ -167,7 +409,7 @@ def sparse_features_from_buffer(sig: str, dq: deque, now_lsl: float):
 
     return feats
 
-def extract_features(now_lsl: float):
+def extract_features(buffers: dict, now_lsl: float, feature_order: list):
     feats = {}
     reasons = []
 
@@ -192,8 +434,8 @@ def extract_features(now_lsl: float):
         return None, reasons
 
     # Enforce schema exactly
-    missing_cols = [c for c in FEATURE_ORDER if c not in feats]
-    extra_cols = [c for c in feats.keys() if c not in set(FEATURE_ORDER)]
+    missing_cols = [c for c in feature_order if c not in feats]
+    extra_cols = [c for c in feats.keys() if c not in set(feature_order)]
     if missing_cols:
         return None, [f"schema missing: {missing_cols[:12]}{'...' if len(missing_cols)>12 else ''}"]
     if extra_cols:
@@ -201,8 +443,8 @@ def extract_features(now_lsl: float):
 
     return feats, []
 
-def predict_from_feats(feats: dict):
-    X = pd.DataFrame([[feats[c] for c in FEATURE_ORDER]], columns=FEATURE_ORDER)
+def predict_from_feats(clf, le, feature_order: list, feats: dict):
+    X = pd.DataFrame([[feats[c] for c in feature_order]], columns=feature_order)
     pred_class = int(clf.predict(X)[0])
     label = le.inverse_transform([pred_class])[0]
 
@@ -216,42 +458,129 @@ def predict_from_feats(feats: dict):
 # -------------------------
 # MAIN LOOP
 # -------------------------
-while True:
-    now_lsl = local_clock()
-
-    # Pull chunks (better than pull_sample for high-rate streams)
-    for stream_name, inlet in inlets:
-        chunk, ts_list = inlet.pull_chunk(timeout=0.0, max_samples=512)
-        if ts_list:
-            for samp, ts in zip(chunk, ts_list):
-                buffers[stream_name].append((float(ts), float(samp[0])))
-
-    prune_old(now_lsl)
-
-    if now_lsl - last_pred_t >= STRIDE_SECONDS:
-        last_pred_t = now_lsl
-        stride_count += 1
-
-        if PRINT_BUFFER_HEALTH_EVERY and (stride_count % PRINT_BUFFER_HEALTH_EVERY == 0):
-            print(buffer_health(now_lsl))
-
-        feats, reasons = extract_features(now_lsl)
-        if feats is None:
-            if PRINT_SKIP_REASONS:
-                print("[SKIP] cannot predict:", "; ".join(reasons[:6]) + (" ..." if len(reasons) > 6 else ""))
-            time.sleep(SLEEP_SECONDS)
-            continue
-
-        try:
-            label, conf = predict_from_feats(feats)
-            ts_str = time.strftime("%H:%M:%S")
-            if conf is None:
-                print(f"[{ts_str}] -> {label}")
+def run(clf, le, feature_order, pull, clock, sleep=time.sleep, metrics=None, started=None,
+        time_label=lambda now: time.strftime("%H:%M:%S")):
+    """
+    Inference loop shared by live LSL (serve) and offline replay.
+
+    pull() -> [(stream_name, chunk, timestamps)], or None to stop
+    clock() -> current time on the same timeline as the timestamps
+    started: time.perf_counter() at process start, for time-to-first-prediction
+    """
+    started = time.perf_counter() if started is None else started
+    metrics = metrics or Metrics(LSL_TO_SIGNAL.keys())
+
+    # buffers store (lsl_ts, value)
+    buffers = {lsl: deque() for lsl in LSL_TO_SIGNAL.keys()}
+    last_pred_t = clock()
+    # Until the first full stride, retry every WARMUP_RETRY_SECONDS so the first
+    # prediction lands as soon as the buffers fill; after that, stride rate only
+    warmup_until = last_pred_t + STRIDE_SECONDS
+    stride_count = 0
+    last_metrics_dump = time.monotonic()
+
+    print("\n--- Realtime inference started ---\n")
+
+    while True:
+        now_lsl = clock()
+        cutoff = now_lsl - WINDOW_SECONDS
+
+        # Pull chunks (better than pull_sample for high-rate streams)
+        t_stage = time.perf_counter()
+        pulled = pull()
+        if pulled is None:
+            break
+        for stream_name, chunk, ts_list in pulled:
+            if ts_list:
+                late = 0
+                for samp, ts in zip(chunk, ts_list):
+                    if ts < cutoff:
+                        late += 1
+                    buffers[stream_name].append((float(ts), float(samp[0])))
+                metrics.add_samples(stream_name, len(ts_list), late, len(ts_list) >= MAX_SAMPLES_PER_PULL)
+        metrics.observe_stage("pull", time.perf_counter() - t_stage)
+
+        t_stage = time.perf_counter()
+        prune_old(buffers, now_lsl)
+        metrics.observe_stage("prune", time.perf_counter() - t_stage)
+
+        first = metrics.predictions == 0
+        warming_up = first and now_lsl < warmup_until
+        stride_due = now_lsl - last_pred_t >= STRIDE_SECONDS
+        if stride_due or (warming_up and now_lsl - last_pred_t >= WARMUP_RETRY_SECONDS):
+            # Warm-up retries stay quiet; only full strides report
+            verbose = stride_due
+            due_at = now_lsl if warming_up else last_pred_t + STRIDE_SECONDS
+            t_stride = time.perf_counter()
+            last_pred_t = now_lsl
+            if verbose:
+                stride_count += 1
+
+            if verbose and PRINT_BUFFER_HEALTH_EVERY and (stride_count % PRINT_BUFFER_HEALTH_EVERY == 0):
+                print(buffer_health(buffers, now_lsl))
+
+            t_stage = time.perf_counter()
+            feats, reasons = extract_features(buffers, now_lsl, feature_order)
+            metrics.observe_stage("features", time.perf_counter() - t_stage)
+            if feats is None:
+                metrics.count("skipped")
+                if verbose and PRINT_SKIP_REASONS:
+                    print("[SKIP] cannot predict:", "; ".join(reasons[:6]) + (" ..." if len(reasons) > 6 else ""))
             else:
-                print(f"[{ts_str}] -> {label} (conf={conf:.2f})")
-        except Exception as e:
-            print("[ERROR] prediction failed:", repr(e))
-            print("[DEBUG] first 12 feature keys:", FEATURE_ORDER[:12])
-            print("[DEBUG] example values:", [feats[k] for k in FEATURE_ORDER[:5]])
-
-    time.sleep(SLEEP_SECONDS)
+                try:
+                    t_stage = time.perf_counter()
+                    label, conf = predict_from_feats(clf, le, feature_order, feats)
+                    metrics.observe_stage("predict", time.perf_counter() - t_stage)
+                    metrics.count("predictions")
+                    if first:
+                        metrics.first_prediction_seconds = time.perf_counter() - started
+                        print(f"[STARTUP] first prediction {metrics.first_prediction_seconds:.2f}s after start")
+                    ts_str = time_label(now_lsl)
+                    if conf is None:
+                        print(f"[{ts_str}] -> {label}")
+                    else:
+                        print(f"[{ts_str}] -> {label} (conf={conf:.2f})")
+                except Exception as e:
+                    metrics.count("errors")
+                    if verbose:
+                        print("[ERROR] prediction failed:", repr(e))
+                        print("[DEBUG] first 12 feature keys:", feature_order[:12])
+                        print("[DEBUG] example values:", [feats[k] for k in feature_order[:5]])
+
+            metrics.observe_stage("stride", time.perf_counter() - t_stride)
+            metrics.observe_lag(clock() - due_at)
+            if stride_due:
+                # Rates over the last stride, so /metrics shows falling behind within one stride
+                metrics.update_rates()
+
+        if time.monotonic() - last_metrics_dump >= METRICS_DUMP_EVERY_SECONDS:
+            last_metrics_dump = time.monotonic()
+            if METRICS_JSON_PATH:
+                metrics.dump_json(METRICS_JSON_PATH)
+
+        sleep(SLEEP_SECONDS)
+
+    return metrics
+
+
+def main(model_dir: str = MODEL_DIR, started=None):
+    started = time.perf_counter() if started is None else started
+
+    metrics = Metrics(LSL_TO_SIGNAL.keys())
+    if METRICS_HTTP_PORT:
+        start_metrics_server(metrics, METRICS_HTTP_PORT)
+
+    # Load (and warm up) the model while LSL resolves streams; both take ~1s
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        model = pool.submit(load_model, model_dir)
+        inlets = connect_inlets()
+        clf, le, feature_order = model.result()
+    print(f"[STARTUP] model + streams ready {time.perf_counter() - started:.2f}s after start")
+
+    from pylsl import local_clock
+
+    run(clf, le, feature_order, lsl_puller(inlets), local_clock, metrics=metrics, started=started)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+
+from real_time_prediction import MODEL_DIR, MAX_SAMPLES_PER_PULL, Metrics, LSL_TO_SIGNAL, load_model, run
+
+# -------------------------
+# CONFIG
+# -------------------------
+# Simulated seconds advanced per loop iteration
+REPLAY_TICK_SECONDS = 0.1
+
+# EmotiBit SD file TypeTag -> LSL stream name used by real_time_prediction.py
+TAG_TO_LSL = {
+    "AX": "ACC_X",
+    "AY": "ACC_Y",
+    "AZ": "ACC_Z",
+    "EA": "EDA",
+    "GX": "GYRO_X",
+    "GY": "GYRO_Y",
+    "GZ": "GYRO_Z",
+    "HR": "HR",
+    "MX": "MAG_X",
+    "MY": "MAG_Y",
+    "MZ": "MAG_Z",
+    "PG": "PPG_GRN",
+    "PI": "PPG_IR",
+    "PR": "PPG_RED",
+    "SA": "SCR_AMP",
+    "SF": "SCR_FREQ",
+    "SR": "SCR_RIS",
+    "T1": "TEMP1",
+}
+
+
+def session_prefix(path: str) -> str:
+    # Accept ".../<session>" or any file of the session (".../<session>_info.json")
+    if path.endswith((".csv", ".json")):
+        return path.rsplit("_", 1)[0]
+    return path
+
+
+def load_session(prefix: str) -> dict:
+    """
+    {lsl_name: (timestamps, values)} for every channel file of an SD session.
+    Timestamps are EmotiBitTimestamp in seconds: one device clock for all channels.
+    """
+    streams = {}
+    for tag, lsl_name in TAG_TO_LSL.items():
+        path = f"{prefix}_{tag}.csv"
+        if not os.path.exists(path):
+            continue
+        df = pd.read_csv(path, usecols=["EmotiBitTimestamp", tag]).dropna()
+        df = df.sort_values("EmotiBitTimestamp", kind="stable")
+        streams[lsl_name] = (
+            df["EmotiBitTimestamp"].to_numpy(dtype=float) / 1000.0,
+            df[tag].to_numpy(dtype=float),
+        )
+
+    if not streams:
+        raise RuntimeError(f"No EmotiBit channel files found for session {prefix!r}")
+    return streams
+
+
+class SessionReplay:
+    """
+    Feeds a recorded session to run() through the same pull()/clock() interface as
+    live LSL inlets. speed=0 replays as fast as possible; speed=1 is real time.
+    """
+
+    def __init__(self, streams: dict, speed: float = 0.0, tick: float = REPLAY_TICK_SECONDS):
+        self.streams = streams
+        self.speed = speed
+        self.tick = tick
+        self.pos = {name: 0 for name in streams}
+        self.start = min(ts[0] for ts, _ in streams.values() if len(ts))
+        self.end = max(ts[-1] for ts, _ in streams.values() if len(ts))
+        self.now = self.start
+
+    def clock(self) -> float:
+        return self.now
+
+    def pull(self):
+        if self.now > self.end:
+            return None
+
+        out = []
+        for name, (ts, values) in self.streams.items():
+            i = self.pos[name]
+            j = min(int(np.searchsorted(ts, self.now, side="right")), i + MAX_SAMPLES_PER_PULL)
+            if j > i:
+                out.append((name, values[i:j].reshape(-1, 1).tolist(), ts[i:j].tolist()))
+                self.pos[name] = j
+        return out
+
+    def sleep(self, _seconds):
+        self.now += self.tick
+        if self.speed > 0:
+            time.sleep(self.tick / self.speed)
+
+    def time_label(self, now: float) -> str:
+        return f"+{now - self.start:7.1f}s"
+
+
+def main(session: str, model_dir: str = MODEL_DIR, speed: float = 0.0, started=None):
+    started = time.perf_counter() if started is None else started
+
+    clf, le, feature_order = load_model(model_dir)
+    replay = SessionReplay(load_session(session_prefix(session)), speed=speed)
+    print(f"[STARTUP] model + session ready {time.perf_counter() - started:.2f}s after start")
+
+    metrics = run(
+        clf, le, feature_order,
+        replay.pull, replay.clock,
+        sleep=replay.sleep,
+        metrics=Metrics(LSL_TO_SIGNAL.keys()),
+        started=started,
+        time_label=replay.time_label,
+    )
+
+    snap = metrics.snapshot()
+    print(f"\nDone. Replayed {replay.end - replay.start:.1f}s of data: "
+          f"{snap['predictions']} predictions, {snap['skipped']} skipped, {snap['errors']} errors.")
+    for stage, h in snap["stage_latency_seconds"].items():
+        if h["count"]:
+            print(f"  {stage:9s} mean={h['mean'] * 1000:7.2f}ms max={h['max'] * 1000:7.2f}ms n={h['count']}")
+    return metrics
+
+
+if __name__ == "__main__":
+    import sys
+
+    main(sys.argv[1])
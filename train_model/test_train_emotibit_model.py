@@ -0,0 +1,52 @@
+import pandas as pd
+
+from train_emotibit_model import known_bad_windows, load_gap_spans
+
+
+def _write(path, rows):
+    pd.DataFrame(rows, columns=["device_id", "signal", "start_at", "end_at"]).to_csv(path, index=False)
+
+
+def _ts(seconds):
+    return pd.Timestamp(seconds, unit="s", tz="UTC")
+
+
+def test_known_bad_windows_ignores_devices_not_recording(tmp_path):
+    # Device A: recording 0-200s with an 8s gap at 100s.
+    # Device B: recording 9900-10100s with an 8s gap at 10000s.
+    _write(tmp_path / "coverage.csv", [
+        ("A", "ax", _ts(100), _ts(108)),
+        ("B", "ax", _ts(10000), _ts(10008)),
+    ])
+    _write(tmp_path / "recording_spans.csv", [
+        ("A", "ax", _ts(0), _ts(200)),
+        ("B", "ax", _ts(9900), _ts(10100)),
+    ])
+
+    starts = pd.DatetimeIndex([_ts(99), _ts(9999), _ts(50)])
+    bad = known_bad_windows(load_gap_spans(tmp_path), starts)
+
+    assert bad.tolist() == [True, True, False]
+
+
+def test_known_bad_windows_needs_gap_on_every_recording_device(tmp_path):
+    # Both devices recording over the same span; only A has the gap, so B's data
+    # fills the pooled window
+    _write(tmp_path / "coverage.csv", [("A", "ax", _ts(100), _ts(108))])
+    _write(tmp_path / "recording_spans.csv", [
+        ("A", "ax", _ts(0), _ts(200)),
+        ("B", "ax", _ts(0), _ts(200)),
+    ])
+
+    bad = known_bad_windows(load_gap_spans(tmp_path), pd.DatetimeIndex([_ts(99)]))
+
+    assert bad.tolist() == [False]
+
+
+def test_known_bad_windows_leaves_unrecorded_windows_to_min_samples(tmp_path):
+    _write(tmp_path / "coverage.csv", [("A", "ax", _ts(100), _ts(108))])
+    _write(tmp_path / "recording_spans.csv", [("A", "ax", _ts(0), _ts(200))])
+
+    bad = known_bad_windows(load_gap_spans(tmp_path), pd.DatetimeIndex([_ts(500)]))
+
+    assert bad.tolist() == [False]
@@ -1,20 +1,28 @@
 import pandas as pd
 import numpy as np
 from pathlib import Path
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import LabelEncoder
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report
-import joblib
+
+# sklearn/joblib are imported inside train_model()/save_model(): they are the slowest
+# imports here and only needed once the dataset is built
 
 # -------------------------
 # CONFIG
 # -------------------------
 DATA_DIR = Path("training_data")
+MODEL_DIR = Path("models")
 WINDOW_SECONDS = 10
 STRIDE_SECONDS = 5
 UNKNOWN_LABEL = "unknown"
 
+# "raw": window the per-sample CSVs here (extract_data.py EXTRACT_MODE = "raw")
+# "aggregates": use per-window stats computed in Postgres (EXTRACT_MODE = "aggregates");
+#               windows are aligned to multiples of STRIDE_SECONDS since the epoch
+FEATURE_SOURCE = "raw"
+
+# Skip windows up front when a dense signal's known gaps (training_data/coverage.csv,
+# from batch_ingest's quality stage) cover more than this fraction of the window
+MAX_GAP_FRACTION = 0.5
+
 WINDOW = pd.Timedelta(seconds=WINDOW_SECONDS)
 STRIDE = pd.Timedelta(seconds=STRIDE_SECONDS)
 
@@ -61,21 +69,48 @@ SIGNALS = list(SIGNAL_SPECS.keys())
 # -------------------------
 # LOAD LABEL INTERVALS
 # -------------------------
-labels = pd.read_csv(
-    DATA_DIR / "label_intervals.csv",
-    parse_dates=["started_at", "ended_at"]
-).sort_values("started_at").reset_index(drop=True)
+def load_labels(data_dir: Path = DATA_DIR) -> pd.DataFrame:
+    return pd.read_csv(
+        Path(data_dir) / "label_intervals.csv",
+        parse_dates=["started_at", "ended_at"]
+    ).sort_values("started_at").reset_index(drop=True)
 
 # -------------------------
 # LOAD SENSOR CSVs
 # -------------------------
-def load_sensor(name: str) -> pd.DataFrame:
-    df = pd.read_csv(DATA_DIR / f"emotibit_{name}.csv", parse_dates=["recorded_at"])
+def load_sensor(name: str, data_dir: Path = DATA_DIR) -> pd.DataFrame:
+    df = pd.read_csv(Path(data_dir) / f"emotibit_{name}.csv", parse_dates=["recorded_at"])
     df = df.sort_values("recorded_at")
     df = df[["recorded_at", "value"]].rename(columns={"value": name})
     return df
 
-sensors = {s: load_sensor(s) for s in SIGNALS}
+def load_sensor_aggregates(name: str, data_dir: Path = DATA_DIR) -> pd.DataFrame:
+    """
+    Per-window aggregates with devices merged, so each window matches what the raw
+    path computes over all rows of the table.
+    """
+    df = pd.read_csv(
+        Path(data_dir) / f"agg_emotibit_{name}.csv",
+        parse_dates=["window_start", "window_end", "first_at", "last_at"],
+    )
+    df["s1"] = df["mean"] * df["n"]
+    df = df.sort_values("last_at")
+
+    g = df.groupby("window_start", sort=True)
+    out = g.agg(
+        window_end=("window_end", "first"),
+        n=("n", "sum"),
+        s1=("s1", "sum"),
+        sum_sq=("sum_sq", "sum"),
+        min=("min", "min"),
+        max=("max", "max"),
+        first_at=("first_at", "min"),
+        last_at=("last_at", "max"),
+        last_value=("last_value", "last"),  # sorted by last_at
+    )
+    out["mean"] = out["s1"] / out["n"]
+    out["std"] = np.sqrt(np.maximum(out["sum_sq"] / out["n"] - out["mean"] ** 2, 0.0))
+    return out.drop(columns=["s1"])
 
 # -------------------------
 # FEATURE EXTRACTION
@@ -139,7 +174,62 @@ def sparse_features(df: pd.DataFrame, col: str, t0: pd.Timestamp, t1: pd.Timesta
 
     return feats
 
-def extract_window_features(t0: pd.Timestamp, t1: pd.Timestamp):
+def dense_features_from_agg(a, col: str, min_samples: int):
+    # a: one aggregate row (or None if the window had no samples)
+    n = int(a["n"]) if a is not None else 0
+    if n < min_samples:
+        return None
+
+    span = float((a["last_at"] - a["first_at"]).total_seconds())
+    # mean of consecutive diffs telescopes to span / (n - 1)
+    mean_dt = span / (n - 1) if n >= 2 else np.nan
+    eff_hz = float(1.0 / mean_dt) if (n >= 2 and mean_dt > 0) else np.nan
+
+    return {
+        f"{col}_mean": float(a["mean"]),
+        f"{col}_std": float(a["std"]),
+        f"{col}_min": float(a["min"]),
+        f"{col}_max": float(a["max"]),
+        f"{col}_energy": float(a["sum_sq"]),
+        f"{col}_samples": float(n),
+        f"{col}_mean_dt": mean_dt,
+        f"{col}_effective_hz": eff_hz,
+        f"{col}_coverage": float(span / WINDOW_SECONDS) if WINDOW_SECONDS > 0 else np.nan,
+    }
+
+def sparse_features_from_agg(a, col: str, t1: pd.Timestamp):
+    if a is None:
+        return {
+            f"{col}_count": 0.0,
+            f"{col}_last": np.nan,
+            f"{col}_time_since_last": float(WINDOW_SECONDS),
+            f"{col}_mean": np.nan,
+            f"{col}_std": np.nan,
+        }
+
+    return {
+        f"{col}_count": float(a["n"]),
+        f"{col}_last": float(a["last_value"]),
+        f"{col}_time_since_last": float((t1 - a["last_at"]).total_seconds()),
+        f"{col}_mean": float(a["mean"]),
+        f"{col}_std": float(a["std"]) if a["n"] >= 2 else 0.0,
+    }
+
+def extract_window_features_from_agg(aggregates: dict, t0: pd.Timestamp, t1: pd.Timestamp):
+    feats = {}
+    for sig, spec in SIGNAL_SPECS.items():
+        agg = aggregates[sig]
+        a = agg.loc[t0] if t0 in agg.index else None
+        if spec["type"] == "dense":
+            f = dense_features_from_agg(a, sig, min_samples=spec["min_samples"])
+            if f is None:
+                return None
+            feats.update(f)
+        else:
+            feats.update(sparse_features_from_agg(a, sig, t1))
+    return feats
+
+def extract_window_features(sensors: dict, t0: pd.Timestamp, t1: pd.Timestamp):
     feats = {}
     for sig, spec in SIGNAL_SPECS.items():
         df = sensors[sig]
@@ -155,7 +245,7 @@ def extract_window_features(t0: pd.Timestamp, t1: pd.Timestamp):
 # -------------------------
 # LABEL ASSIGNMENT (efficient-ish)
 # -------------------------
-def label_for_window(t0: pd.Timestamp, t1: pd.Timestamp) -> str:
+def label_for_window(labels: pd.DataFrame, t0: pd.Timestamp, t1: pd.Timestamp) -> str:
     # strict containment like your original: window must be fully inside interval
     # if you want overlap-based labeling later, change this function.
     for _, row in labels.iterrows():
@@ -166,75 +256,208 @@ def label_for_window(t0: pd.Timestamp, t1: pd.Timestamp) -> str:
     return UNKNOWN_LABEL
 
 # -------------------------
-# WINDOWING
+# KNOWN-BAD SPANS
 # -------------------------
-start = min(df["recorded_at"].min() for df in sensors.values())
-end = max(df["recorded_at"].max() for df in sensors.values())
-
-X, y = [], []
-t = start
+def epoch_seconds(ts) -> np.ndarray:
+    ts = pd.to_datetime(ts, utc=True)
+    return np.asarray((ts - pd.Timestamp(0, tz="UTC")) / pd.Timedelta(seconds=1), dtype=float)
+
+def load_gap_spans(data_dir: Path = DATA_DIR):
+    """
+    {dense signal: [(gap starts, gap ends, recording starts, recording ends) per device]}
+    as sorted epoch-second arrays. Recording arrays are None when recording_spans.csv
+    is missing (older exports); such devices are assumed to be recording throughout.
+    """
+    path = Path(data_dir) / "coverage.csv"
+    if not path.exists():
+        return {}
+
+    dense = {s for s, spec in SIGNAL_SPECS.items() if spec["type"] == "dense"}
+
+    def spans_by_device(csv_path):
+        df = pd.read_csv(csv_path, parse_dates=["start_at", "end_at"])
+        out = {}
+        for key, g in df[df["signal"].isin(dense)].groupby(["signal", "device_id"]):
+            g = g.sort_values("start_at")
+            out[key] = (epoch_seconds(g["start_at"]), epoch_seconds(g["end_at"]))
+        return out
+
+    gaps = spans_by_device(path)
+    rec_path = Path(data_dir) / "recording_spans.csv"
+    recordings = spans_by_device(rec_path) if rec_path.exists() else None
+
+    empty = (np.zeros(0), np.zeros(0))
+    spans = {}
+    for sig, device in sorted(set(gaps) | set(recordings or {})):
+        g0, g1 = gaps.get((sig, device), empty)
+        r0, r1 = recordings.get((sig, device), empty) if recordings is not None else (None, None)
+        spans.setdefault(sig, []).append((g0, g1, r0, r1))
+    return spans
+
+def gap_seconds_in(starts: np.ndarray, ends: np.ndarray, t0: np.ndarray, t1: np.ndarray) -> np.ndarray:
+    # Time covered by the spans inside each [t0, t1); spans are sorted and
+    # non-overlapping, so use the cumulative span length up to t and difference it
+    if len(starts) == 0:
+        return np.zeros(len(t0))
+
+    lengths = ends - starts
+    cum = np.concatenate([[0.0], np.cumsum(lengths)])
+
+    def covered_until(t):
+        k = np.searchsorted(starts, t, side="right")
+        prev = np.maximum(k - 1, 0)
+        partial = np.where(k > 0, np.clip(t - starts[prev], 0.0, lengths[prev]), 0.0)
+        return cum[prev] * (k > 0) + partial
+
+    return covered_until(t1) - covered_until(t0)
+
+def known_bad_windows(gap_spans: dict, window_starts) -> np.ndarray:
+    """
+    Boolean mask over window starts: True where some dense signal's gaps cover more
+    than MAX_GAP_FRACTION of the window. The trainer pools devices, so a window is
+    only bad if every device that was recording during it has the gap; devices that
+    weren't recording are ignored, and a window nobody recorded is left to min_samples.
+    """
+    t0 = epoch_seconds(window_starts)
+    t1 = t0 + WINDOW_SECONDS
+    bad = np.zeros(len(t0), dtype=bool)
+    for sig, per_device in gap_spans.items():
+        sig_bad = np.ones(len(t0), dtype=bool)
+        any_recording = np.zeros(len(t0), dtype=bool)
+        for g0, g1, r0, r1 in per_device:
+            recording = np.ones(len(t0), dtype=bool) if r0 is None else gap_seconds_in(r0, r1, t0, t1) > 0
+            gap = gap_seconds_in(g0, g1, t0, t1)
+            sig_bad &= ~recording | (gap > MAX_GAP_FRACTION * WINDOW_SECONDS)
+            any_recording |= recording
+        bad |= sig_bad & any_recording
+    return bad
 
-skipped = 0
-while t + WINDOW <= end:
-    t_end = t + WINDOW
+# -------------------------
+# WINDOWING
+# -------------------------
+def build_dataset(data_dir: Path = DATA_DIR, feature_source: str = FEATURE_SOURCE):
+    """Window the exported CSVs into (X features DataFrame, y labels array)."""
+    labels = load_labels(data_dir)
+    gap_spans = load_gap_spans(data_dir)
+
+    X, y = [], []
+    skipped = 0
+    prefiltered = 0
+
+    if feature_source == "aggregates":
+        aggregates = {s: load_sensor_aggregates(s, data_dir) for s in SIGNALS}
+
+        # Only windows where every dense signal has data can pass min_samples
+        dense = [s for s, spec in SIGNAL_SPECS.items() if spec["type"] == "dense"]
+        all_starts = sorted(set().union(*(aggregates[s].index for s in SIGNALS)))
+        candidates = set(all_starts)
+        for s in dense:
+            candidates &= set(aggregates[s].index)
+        skipped = len(all_starts) - len(candidates)
+
+        candidates = pd.DatetimeIndex(sorted(candidates))
+        if len(candidates) and gap_spans:
+            bad = known_bad_windows(gap_spans, candidates)
+            prefiltered = int(bad.sum())
+            candidates = candidates[~bad]
+
+        for t in candidates:
+            t_end = t + WINDOW
+
+            feats = extract_window_features_from_agg(aggregates, t, t_end)
+            if feats is None:
+                skipped += 1
+                continue
+
+            y.append(label_for_window(labels, t, t_end))
+            X.append(feats)
+    else:
+        sensors = {s: load_sensor(s, data_dir) for s in SIGNALS}
 
-    feats = extract_window_features(t, t_end)
-    if feats is None:
-        skipped += 1
-        t += STRIDE
-        continue
+        start = min(df["recorded_at"].min() for df in sensors.values())
+        end = max(df["recorded_at"].max() for df in sensors.values())
 
-    y.append(label_for_window(t, t_end))
-    X.append(feats)
+        window_starts = pd.date_range(start, end - WINDOW, freq=STRIDE)
+        if len(window_starts) and gap_spans:
+            bad = known_bad_windows(gap_spans, window_starts)
+            prefiltered = int(bad.sum())
+            window_starts = window_starts[~bad]
 
-    t += STRIDE
+        for t in window_starts:
+            t_end = t + WINDOW
 
-X = pd.DataFrame(X)
-y = np.array(y)
+            feats = extract_window_features(sensors, t, t_end)
+            if feats is None:
+                skipped += 1
+                continue
 
-print("Windows kept:", len(y), "Skipped:", skipped)
-print("Label distribution:")
-print(pd.Series(y).value_counts())
+            y.append(label_for_window(labels, t, t_end))
+            X.append(feats)
 
-# Drop unknown if you want a purely supervised activity classifier
-# (optional; if you keep UNKNOWN, it becomes another class)
-# mask = (y != UNKNOWN_LABEL)
-# X, y = X[mask], y[mask]
+    X = pd.DataFrame(X)
+    y = np.array(y)
 
-# -------------------------
-# ENCODE + SPLIT
-# -------------------------
-le = LabelEncoder()
-y_enc = le.fit_transform(y)
+    print("Windows kept:", len(y), "Skipped:", skipped, "Prefiltered (known gaps):", prefiltered)
+    print("Label distribution:")
+    print(pd.Series(y).value_counts())
 
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y_enc,
-    test_size=0.2,
-    stratify=y_enc,
-    random_state=42
-)
+    # Drop unknown if you want a purely supervised activity classifier
+    # (optional; if you keep UNKNOWN, it becomes another class)
+    # mask = (y != UNKNOWN_LABEL)
+    # X, y = X[mask], y[mask]
 
-# -------------------------
-# TRAIN
-# -------------------------
-clf = RandomForestClassifier(
-    n_estimators=500,
-    n_jobs=-1,
-    class_weight="balanced",
-    random_state=42
-)
-clf.fit(X_train, y_train)
+    return X, y
 
 # -------------------------
-# EVAL
+# ENCODE + SPLIT + TRAIN + EVAL
 # -------------------------
-y_pred = clf.predict(X_test)
-print(classification_report(y_test, y_pred, target_names=le.classes_))
+def train_model(X: pd.DataFrame, y: np.ndarray):
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import LabelEncoder
+    from sklearn.model_selection import train_test_split
+    from sklearn.metrics import classification_report
+
+    le = LabelEncoder()
+    y_enc = le.fit_transform(y)
+
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y_enc,
+        test_size=0.2,
+        stratify=y_enc,
+        random_state=42
+    )
+
+    clf = RandomForestClassifier(
+        n_estimators=500,
+        n_jobs=-1,
+        class_weight="balanced",
+        random_state=42
+    )
+    clf.fit(X_train, y_train)
+
+    y_pred = clf.predict(X_test)
+    print(classification_report(y_test, y_pred, target_names=le.classes_))
+
+    return clf, le
 
 # -------------------------
 # SAVE
 # -------------------------
-Path("models").mkdir(exist_ok=True)
-joblib.dump(clf, "models/emotibit_activity_model.joblib")
-joblib.dump(le, "models/label_encoder.joblib")
-print("Model saved.")
+def save_model(clf, le, model_dir: Path = MODEL_DIR):
+    import joblib
+
+    model_dir = Path(model_dir)
+    model_dir.mkdir(exist_ok=True)
+    joblib.dump(clf, model_dir / "emotibit_activity_model.joblib")
+    joblib.dump(le, model_dir / "label_encoder.joblib")
+    print("Model saved.")
+
+
+def main(data_dir: Path = DATA_DIR, feature_source: str = FEATURE_SOURCE, model_dir: Path = MODEL_DIR):
+    X, y = build_dataset(data_dir, feature_source)
+    clf, le = train_model(X, y)
+    save_model(clf, le, model_dir)
+
+
+if __name__ == "__main__":
+    main()